@@ -0,0 +1,40 @@
+// Öffnet einen Server-Sent-Events-Kanal und stößt die Live-Callbacks nur dann an,
+// wenn tatsächlich ein neuer Messwert in der Datenbank gelandet ist.
+// Sind alle Live-Verbindungen des Servers belegt (503), wird ersatzweise periodisch aktualisiert.
+(function () {
+    var ABFRAGE_INTERVALL = 60000;
+
+    function signal(ereignis) {
+        ereignis.empfangen = Date.now();
+        window.dash_clientside.set_props("live-signal", {data: ereignis});
+    }
+
+    function verbinden() {
+        if (!window.dash_clientside || !window.dash_clientside.set_props) {
+            setTimeout(verbinden, 500);
+            return;
+        }
+
+        var quelle = new EventSource("/stream");
+        quelle.onmessage = function (e) {
+            signal(JSON.parse(e.data));
+        };
+        quelle.onerror = function () {
+            // Bei Netzwerkfehlern verbindet sich EventSource selbst neu; nur bei Ablehnung ist sie geschlossen
+            if (quelle.readyState !== EventSource.CLOSED) {
+                return;
+            }
+            signal({zeit: Date.now() / 1000, sensoren: null});
+            var abfrage = setInterval(function () {
+                signal({zeit: Date.now() / 1000, sensoren: null});
+            }, ABFRAGE_INTERVALL);
+            // Später erneut versuchen, eine Live-Verbindung zu bekommen
+            setTimeout(function () {
+                clearInterval(abfrage);
+                verbinden();
+            }, 5 * ABFRAGE_INTERVALL);
+        };
+    }
+
+    verbinden();
+})();
@@ -28,4 +28,77 @@ CREATE TABLE IF NOT EXISTS sensor_verlauf (
 );
 
 -- Als Hypertable anlegen
-SELECT create_hypertable('sensor_verlauf', 'zeitstempel', if_not_exists => TRUE);
\ No newline at end of file
+SELECT create_hypertable('sensor_verlauf', 'zeitstempel', if_not_exists => TRUE);
+
+-- Benachrichtigt alle Dashboard-Prozesse (LISTEN sensor_daten_neu), sobald ein neuer Messwert eingefügt wurde
+CREATE OR REPLACE FUNCTION sensor_daten_benachrichtigen() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('sensor_daten_neu', json_build_object(
+        'box_id', NEW.box_id,
+        'sensor_id', NEW.sensor_id,
+        'zeitstempel', NEW.zeitstempel,
+        'messwert', NEW.messwert,
+        'einheit', NEW.einheit
+    )::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Feuert nur für tatsächlich eingefügte Zeilen (ON CONFLICT DO NOTHING löst keinen Trigger aus)
+DROP TRIGGER IF EXISTS sensor_daten_neu ON sensor_daten;
+CREATE TRIGGER sensor_daten_neu
+    AFTER INSERT ON sensor_daten
+    FOR EACH ROW EXECUTE FUNCTION sensor_daten_benachrichtigen();
+
+
+-- Tabelle für vorberechnete Prognosen (gemeinsam für alle Worker und Replikate)
+CREATE TABLE IF NOT EXISTS sensor_prognose (
+    box_id TEXT NOT NULL,
+    sensor_id TEXT NOT NULL,
+    metric TEXT NOT NULL,                 -- Tageskennzahl (min_val, max_val, avg_val)
+    ds TIMESTAMPTZ NOT NULL,              -- Prognostizierter Tag
+    yhat DOUBLE PRECISION,                -- Prognosewert
+    yhat_lower DOUBLE PRECISION,          -- Untere Grenze des Prognoseintervalls
+    yhat_upper DOUBLE PRECISION,          -- Obere Grenze des Prognoseintervalls
+    model_version TEXT NOT NULL,          -- Version im Modellspeicher
+    erstellt_am TIMESTAMPTZ NOT NULL DEFAULT now(),
+    UNIQUE (ds, box_id, sensor_id, metric)
+);
+
+SELECT create_hypertable('sensor_prognose', 'ds', if_not_exists => TRUE);
+
+-- Index für das Lesen der jüngsten Prognosetage je Sensor und Kennzahl
+CREATE INDEX IF NOT EXISTS sensor_prognose_sensor_idx
+    ON sensor_prognose (box_id, sensor_id, metric, ds DESC);
+
+-- Index für das Alter des letzten Prognose-Laufs (max(erstellt_am) je Box)
+CREATE INDEX IF NOT EXISTS sensor_prognose_erstellt_idx
+    ON sensor_prognose (box_id, erstellt_am DESC);
+
+
+-- Indizes für die jüngsten Messwerte je Sensor
+CREATE INDEX IF NOT EXISTS sensor_daten_sensor_idx
+    ON sensor_daten (box_id, sensor_id, zeitstempel DESC);
+CREATE INDEX IF NOT EXISTS sensor_verlauf_sensor_idx
+    ON sensor_verlauf (box_id, sensor_id, zeitstempel DESC);
+
+
+-- Bereits importierte Archivdateien (zum Fortsetzen abgebrochener Importe, siehe archiv_utils.py)
+CREATE TABLE IF NOT EXISTS archiv_import (
+    datei TEXT PRIMARY KEY,               -- Pfad relativ zum Archivverzeichnis
+    groesse BIGINT NOT NULL,              -- Dateigröße beim Import
+    zeilen BIGINT NOT NULL,               -- Gelesene Messwerte
+    importiert_am TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+
+-- Datenstand je Tabelle und Sensor: wird von den Schreibfunktionen erhöht, sobald Zeilen eingefügt
+-- wurden, und invalidiert den Abfrage-Cache (auch beim Nachladen älterer Messwerte)
+CREATE TABLE IF NOT EXISTS datenstand (
+    tabelle TEXT NOT NULL,
+    box_id TEXT NOT NULL,
+    sensor_id TEXT NOT NULL,
+    version BIGINT NOT NULL,
+    geaendert_am TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (tabelle, box_id, sensor_id)
+);
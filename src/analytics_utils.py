@@ -0,0 +1,77 @@
+import os
+import pandas as pd
+from sqlalchemy import text
+from sensor_utils import engine, SENSEBOX_ID, abfrage_gecacht
+
+# Maximal betrachteter Zeitraum in Stunden (begrenzt die Abfrage auf die jüngsten Chunks der Hypertable)
+ANALYSE_FENSTER_STUNDEN = int(os.getenv("ANALYSE_FENSTER_STUNDEN", "48"))
+
+# Ab diesem Betrag des z-Scores gilt ein Messwert als auffällig
+ANOMALIE_SCHWELLE = float(os.getenv("ANOMALIE_SCHWELLE", "3.0"))
+
+# Mindestanzahl an Vergleichswerten, bevor ein z-Score bewertet wird
+ANOMALIE_MIN_WERTE = 10
+
+# Höchstalter der zwischengespeicherten Kennzahlen in Sekunden; die Abfrage hängt von now() ab,
+# ohne neue Messwerte (z. B. bei einem Ausfall) würden die Kennzahlen sonst nie ablaufen
+ANALYSE_CACHE_SEKUNDEN = int(os.getenv("ANALYSE_CACHE_SEKUNDEN", "60"))
+
+# Gleitende Kennzahlen je Messwert per Fensterfunktion; ausgegeben wird nur der jüngste Wert je Sensor.
+# Der z-Score vergleicht den Messwert mit den vorherigen 24 Stunden (ohne den Wert selbst).
+QUERY_ROLLING = text("""
+    WITH fenster AS (
+        SELECT zeitstempel, sensor_id, messwert,
+               AVG(messwert) OVER w1h AS mittel_1h,
+               MIN(messwert) OVER w1h AS min_1h,
+               MAX(messwert) OVER w1h AS max_1h,
+               AVG(messwert) OVER w24h AS mittel_24h,
+               MIN(messwert) OVER w24h AS min_24h,
+               MAX(messwert) OVER w24h AS max_24h,
+               AVG(messwert) OVER w24h_vorher AS mittel_vorher,
+               STDDEV_SAMP(messwert) OVER w24h_vorher AS std_vorher,
+               COUNT(messwert) OVER w24h_vorher AS anzahl_vorher,
+               ROW_NUMBER() OVER (PARTITION BY sensor_id ORDER BY zeitstempel DESC) AS rang
+        FROM sensor_daten
+        WHERE box_id = :box_id
+          AND zeitstempel >= now() - make_interval(hours => :stunden)
+        WINDOW
+            w1h AS (PARTITION BY sensor_id ORDER BY zeitstempel
+                    RANGE BETWEEN INTERVAL '1 hour' PRECEDING AND CURRENT ROW),
+            w24h AS (PARTITION BY sensor_id ORDER BY zeitstempel
+                     RANGE BETWEEN INTERVAL '24 hours' PRECEDING AND CURRENT ROW),
+            w24h_vorher AS (PARTITION BY sensor_id ORDER BY zeitstempel
+                            RANGE BETWEEN INTERVAL '24 hours' PRECEDING AND CURRENT ROW
+                            EXCLUDE CURRENT ROW)
+    )
+    SELECT sensor_id, zeitstempel, messwert,
+           mittel_1h, min_1h, max_1h,
+           mittel_24h, min_24h, max_24h,
+           CASE WHEN anzahl_vorher >= :min_werte AND std_vorher > 0
+                THEN (messwert - mittel_vorher) / std_vorher
+           END AS z_score
+    FROM fenster
+    WHERE rang = 1
+""")
+
+
+# Funktion zum Abrufen gleitender Kennzahlen und Anomalie-Flags je Sensor
+@abfrage_gecacht("sensor_daten", zeitraster=ANALYSE_CACHE_SEKUNDEN)
+def rolling_statistik(box_id=SENSEBOX_ID, stunden=ANALYSE_FENSTER_STUNDEN):
+    """
+    Liefert je Sensor den letzten Messwert mit gleitendem 1h/24h-Mittel, -Minimum und -Maximum,
+    dem z-Score gegenüber den vorherigen 24 Stunden und einem Anomalie-Flag.
+    Die Berechnung läuft in der Datenbank; das Ergebnis wird bis zum nächsten Messwert, höchstens
+    ANALYSE_CACHE_SEKUNDEN lang zwischengespeichert.
+    """
+    with engine.connect() as conn:
+        df = pd.read_sql(QUERY_ROLLING, conn, params={
+            "box_id": box_id,
+            "stunden": stunden,
+            "min_werte": ANOMALIE_MIN_WERTE
+        })
+
+    # Sind alle z-Scores NULL (z. B. nach Neuinstallation oder längerem Ausfall), liefert
+    # read_sql eine object-Spalte; daher erst in Zahlen umwandeln
+    df['z_score'] = pd.to_numeric(df['z_score'], errors='coerce')
+    df['anomalie'] = df['z_score'].abs() >= ANOMALIE_SCHWELLE
+    return df.set_index('sensor_id')
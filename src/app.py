@@ -4,6 +4,8 @@ import dash_bootstrap_components as dbc
 import os
 from sqlalchemy import create_engine
 from cards import *
+from server_utils import asset_url
+from callbacks import LIVE_SENSOR_IDS, PROGNOSE_ANZEIGE_INTERVALL, sensor_signal
 
 # Verbindung zur Datenbank herstellen
 DB_URL = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
@@ -16,20 +18,26 @@ BOX_ID = os.getenv("SENSEBOX_ID")
 TEMP_SENSOR_ID = "67a661af4ef45d0008682745"  # Temperatur-Sensor-ID
 RAIN_SENSOR_ID = "67a7ab164ef45d00089ef795"  # Regen-Sensor-ID
 
-# Dash-App initialisieren mit Bootstrap-Theme 
-app = dash.Dash(__name__, external_stylesheets=[
-    dbc.themes.BOOTSTRAP,  # Bootstrap CSS für Layout und Komponenten
-    "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.5/font/bootstrap-icons.css"  # Bootstrap Icons laden
-])
+# Dash-App initialisieren mit Bootstrap-Theme (lokal unter assets/vendor, ohne CDN)
+app = dash.Dash(
+    __name__,
+    external_stylesheets=[
+        asset_url("vendor/bootstrap.min.css"),  # Bootstrap CSS für Layout und Komponenten
+        asset_url("vendor/bootstrap-icons.min.css")  # Bootstrap Icons
+    ],
+    # Nicht zusätzlich automatisch einbinden – Reihenfolge vor custom.css über external_stylesheets
+    assets_ignore=r"^bootstrap(-icons)?\.min\.css$"
+)
 
 # Titel der App setzen
 app.title = "Umweltmonitoring Dashboard"
 
 # Layout der App definieren
 app.layout = dbc.Container([
-    dcc.Interval(id="daily-model-update", interval=86400 * 1000, n_intervals=0),  # Modell-Update täglich
-    dcc.Interval(id="countdown-timer", interval=1000, n_intervals=0),   # Countdown jede Sekunde
-    dcc.Interval(id="live-update", interval=180 * 1000, n_intervals=0),  # Live-Daten alle 3 Minuten
+    dcc.Interval(id="countdown-timer", interval=1000, n_intervals=0),   # Countdown jede Sekunde (nur im Browser)
+    dcc.Store(id="live-signal"),  # Wird per Server-Sent-Events gesetzt, sobald neue Messwerte vorliegen
+    *[dcc.Store(id=sensor_signal(sensor_id)) for sensor_id in LIVE_SENSOR_IDS],  # Live-Signal je Sensor
+    dcc.Interval(id="prognose-timer", interval=PROGNOSE_ANZEIGE_INTERVALL),  # Prognosekarte neu laden
 
     html.H1("Umweltmonitoring Dashboard", className="display-4 mb-4 text-center fw-bold"),
 
@@ -69,13 +77,29 @@ app.layout = dbc.Container([
         "padding": "10px",
         "borderRadius": "8px",
         "zIndex": "1000"
-    }),
-    html.Div(id="train-dummy-output", style={"display": "none"})
+    })
 ], fluid=True, class_name="px-5 mt-4")
 
 # Callbacks initialisieren (aus separater Datei importiert)
 from callbacks import init_callbacks
 init_callbacks(app)  # Initialisiere die Callbacks
 
+# Live-Updates per Server-Sent-Events (LISTEN/NOTIFY) initialisieren
+from live_utils import init_live_updates
+init_live_updates(app)
+
+# Health- und Readiness-Endpunkte für Container-Orchestrierung
+from server_utils import init_health
+init_health(app)
+
+# Export von Verlaufsdaten als Arrow IPC bzw. Parquet
+from export_utils import init_export
+init_export(app)
+
+# Komprimierung, Cache-Header für Assets und Messung der übertragenen Bytes
+from server_utils import init_auslieferung
+init_auslieferung(app)
+
+# Entwicklungsserver; im Produktivbetrieb über gunicorn (siehe wsgi.py)
 if __name__ == "__main__":
     app.run_server(host="0.0.0.0", port=8050, debug=True)
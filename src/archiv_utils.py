@@ -0,0 +1,187 @@
+import io
+import os
+import re
+import time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from sqlalchemy import text
+from sensor_utils import engine, SENSEBOX_ID, datenstand_erhoehen
+
+# Anzahl der Messwerte, die gemeinsam per COPY geladen und festgeschrieben werden
+ARCHIV_BATCH_ZEILEN = int(os.getenv("ARCHIV_BATCH_ZEILEN", "200000"))
+
+# Anzahl der Prozesse, die Archivdateien parallel einlesen
+ARCHIV_PROZESSE = int(os.getenv("ARCHIV_PROZESSE", str(os.cpu_count() or 2)))
+
+# OpenSenseMap-IDs (24 Hex-Zeichen) am Anfang von Datei- bzw. Verzeichnisnamen,
+# z. B. <archiv>/2024-05-01/<box_id>-<name>/<sensor_id>-<phaenomen>.csv
+OSEM_ID = re.compile(r"^([0-9a-f]{24})(?![0-9a-f])")
+
+
+# Funktion zum Auffinden der Archivdateien samt Box- und Sensor-ID
+def archiv_dateien_finden(verzeichnis, box_id=SENSEBOX_ID, sensor_ids=None):
+    """
+    Gibt sortiert (relativer Pfad, Größe, box_id, sensor_id) je CSV-Datei zurück.
+    Die Sensor-ID stammt aus dem Dateinamen, die Box-ID aus dem nächstgelegenen
+    Verzeichnis mit OpenSenseMap-ID oder – falls keines existiert – aus 'box_id'.
+    """
+    dateien = []
+    for ordner, _, namen in os.walk(verzeichnis):
+        relativ = os.path.relpath(ordner, verzeichnis)
+        box_treffer = [OSEM_ID.match(teil) for teil in relativ.split(os.sep)]
+        ordner_box_id = next((t.group(1) for t in reversed(box_treffer) if t), box_id)
+
+        for name in namen:
+            if not name.endswith((".csv", ".csv.gz")):
+                continue
+            sensor_treffer = OSEM_ID.match(name)
+            if not sensor_treffer:
+                print(f"⚠️ Keine Sensor-ID im Dateinamen: {os.path.join(relativ, name)}")
+                continue
+            if sensor_ids and sensor_treffer.group(1) not in sensor_ids:
+                continue
+            pfad = os.path.join(ordner, name)
+            dateien.append((os.path.relpath(pfad, verzeichnis), os.path.getsize(pfad),
+                            ordner_box_id, sensor_treffer.group(1)))
+    return sorted(dateien)
+
+
+# Funktion zum Einlesen einer Archivdatei (läuft in einem Worker-Prozess)
+def archiv_datei_lesen(pfad, box_id, sensor_id):
+    """
+    Liest eine CSV-Datei mit den Spalten 'createdAt' und 'value' und gibt
+    (Anzahl, COPY-Text) zurück. Doppelte Zeitstempel innerhalb der Datei werden verworfen.
+    """
+    roh = pd.read_csv(pfad, usecols=["createdAt", "value"], dtype={"createdAt": "string"})
+    df = pd.DataFrame({
+        "zeitstempel": pd.to_datetime(roh["createdAt"], format="ISO8601", utc=True, errors="coerce"),
+        "box_id": box_id,
+        "sensor_id": sensor_id,
+        "messwert": pd.to_numeric(roh["value"], errors="coerce")
+    }).dropna().drop_duplicates("zeitstempel")
+
+    # Tabulatorgetrennt, wie von COPY ... FROM STDIN (Textformat) erwartet
+    puffer = io.StringIO()
+    df.to_csv(puffer, sep="\t", header=False, index=False, date_format="%Y-%m-%dT%H:%M:%S.%fZ")
+    return len(df), puffer.getvalue()
+
+
+# Funktion zum Laden eines Batches per COPY und zum Vermerken der importierten Dateien
+def _batch_laden(conn, teile, dateien):
+    """
+    Lädt die Zeilen per COPY in eine temporäre Tabelle und übernimmt nur neue Schlüssel
+    (zeitstempel, box_id, sensor_id) nach 'sensor_verlauf'. Messwerte und Fortschritt werden
+    in derselben Transaktion geschrieben, ein Abbruch verliert also höchstens den laufenden Batch.
+    """
+    with conn.connection.cursor() as cur:
+        cur.copy_expert(
+            "COPY archiv_staging (zeitstempel, box_id, sensor_id, messwert) FROM STDIN",
+            io.StringIO("".join(teile))
+        )
+    neu = conn.execute(text("""
+        WITH neu AS (
+            INSERT INTO sensor_verlauf (zeitstempel, box_id, sensor_id, messwert)
+            SELECT zeitstempel, box_id, sensor_id, messwert FROM archiv_staging
+            ON CONFLICT (zeitstempel, box_id, sensor_id) DO NOTHING
+            RETURNING box_id, sensor_id
+        )
+        SELECT box_id, sensor_id, count(*) FROM neu GROUP BY box_id, sensor_id
+    """)).all()
+    conn.execute(text("""
+        INSERT INTO archiv_import (datei, groesse, zeilen) VALUES (:datei, :groesse, :zeilen)
+        ON CONFLICT (datei) DO UPDATE SET
+            groesse = EXCLUDED.groesse,
+            zeilen = EXCLUDED.zeilen,
+            importiert_am = now()
+    """), [{"datei": datei, "groesse": groesse, "zeilen": zeilen} for datei, groesse, zeilen in dateien])
+    # Zuletzt, damit die Sperre auf dem Datenstand nur kurz gehalten wird (invalidiert den Abfrage-Cache)
+    datenstand_erhoehen(conn, "sensor_verlauf", [(box_id, sensor_id) for box_id, sensor_id, _ in neu])
+    conn.commit()
+    return sum(anzahl for _, _, anzahl in neu)
+
+
+# Funktion zum Importieren eines lokalen Archivverzeichnisses nach 'sensor_verlauf'
+def archiv_importieren(verzeichnis, box_id=SENSEBOX_ID, sensor_ids=None, prozesse=ARCHIV_PROZESSE):
+    """
+    Liest alle noch nicht importierten Archivdateien parallel ein und lädt sie batchweise
+    per COPY in die Datenbank. Bereits importierte Dateien (gleicher Pfad und gleiche Größe)
+    werden übersprungen, sodass ein abgebrochener Import einfach erneut gestartet werden kann.
+    """
+    with engine.connect() as conn:
+        erledigt = dict(conn.execute(text("SELECT datei, groesse FROM archiv_import")).all())
+
+    alle = archiv_dateien_finden(verzeichnis, box_id, sensor_ids)
+    offen = [d for d in alle if erledigt.get(d[0]) != d[1]]
+    print(f"📂 {len(alle)} Archivdateien gefunden, {len(alle) - len(offen)} bereits importiert")
+    if not offen:
+        return 0
+
+    with engine.connect() as conn:
+        conn.execute(text("""
+            CREATE TEMP TABLE IF NOT EXISTS archiv_staging (LIKE sensor_verlauf)
+            ON COMMIT DELETE ROWS
+        """))
+        conn.commit()
+
+        start = time.monotonic()
+        gelesen = neu = fertig = 0
+        teile, dateien, batch_zeilen = [], [], 0
+
+        with ProcessPoolExecutor(max_workers=prozesse) as pool:
+            warteschlange = iter(offen)
+            laufend = {}
+
+            # Nur wenige Dateien gleichzeitig in Arbeit halten, damit der Speicher begrenzt bleibt
+            def nachfuellen():
+                for datei, groesse, datei_box_id, sensor_id in warteschlange:
+                    future = pool.submit(archiv_datei_lesen, os.path.join(verzeichnis, datei),
+                                         datei_box_id, sensor_id)
+                    laufend[future] = (datei, groesse)
+                    if len(laufend) >= 2 * prozesse:
+                        break
+
+            nachfuellen()
+            while laufend:
+                abgeschlossen, _ = wait(laufend, return_when=FIRST_COMPLETED)
+                for future in abgeschlossen:
+                    datei, groesse = laufend.pop(future)
+                    fertig += 1
+                    try:
+                        anzahl, inhalt = future.result()
+                    except (ValueError, OSError) as e:
+                        # Datei wird nicht vermerkt und beim nächsten Lauf erneut versucht
+                        print(f"⚠️ {datei} übersprungen: {e}")
+                        continue
+                    teile.append(inhalt)
+                    dateien.append((datei, groesse, anzahl))
+                    batch_zeilen += anzahl
+                    gelesen += anzahl
+
+                if batch_zeilen >= ARCHIV_BATCH_ZEILEN:
+                    neu += _batch_laden(conn, teile, dateien)
+                    teile, dateien, batch_zeilen = [], [], 0
+                    dauer = time.monotonic() - start
+                    print(f"⏳ {fertig}/{len(offen)} Dateien, {gelesen} Messwerte gelesen, "
+                          f"{neu} neu ({gelesen / dauer:.0f} Messwerte/s)")
+                nachfuellen()
+
+        if dateien:
+            neu += _batch_laden(conn, teile, dateien)
+
+    dauer = time.monotonic() - start
+    print(f"✅ {fertig} Dateien in {dauer:.1f} s importiert: {gelesen} Messwerte, {neu} neu")
+    return neu
+
+
+if __name__ == "__main__":
+    # Lokales Archiv importieren, z. B.: python archiv_utils.py /daten/osem-archiv
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Importiert OpenSenseMap-CSV-Archive in 'sensor_verlauf'.")
+    parser.add_argument("verzeichnis", help="Verzeichnis mit CSV-Dateien je Sensor (rekursiv)")
+    parser.add_argument("--box-id", default=SENSEBOX_ID, help="Box-ID, falls nicht aus dem Pfad ersichtlich")
+    parser.add_argument("--sensor", action="append", help="Sensor-ID (mehrfach möglich, Standard: alle)")
+    parser.add_argument("--prozesse", type=int, default=ARCHIV_PROZESSE, help="Anzahl paralleler Leseprozesse")
+    args = parser.parse_args()
+
+    archiv_importieren(args.verzeichnis, args.box_id, args.sensor, args.prozesse)
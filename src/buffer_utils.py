@@ -0,0 +1,143 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sensor_utils import engine, SENSEBOX_ID
+
+# Anzahl der Messwerte je Sensor (16 Byte pro Messwert, also ca. 46 KB je Sensor bei 2880)
+RINGPUFFER_KAPAZITAET = int(os.getenv("RINGPUFFER_KAPAZITAET", "2880"))
+
+# Zeitraum in Stunden, mit dem die Puffer beim Start aus 'sensor_daten' vorbefüllt werden
+RINGPUFFER_VORLAUF_STUNDEN = int(os.getenv("RINGPUFFER_VORLAUF_STUNDEN", "24"))
+
+
+# Ringpuffer fester Größe mit (Zeitstempel, Messwert) eines Sensors
+class SensorRingPuffer:
+    def __init__(self, kapazitaet=RINGPUFFER_KAPAZITAET):
+        self.zeiten = np.zeros(kapazitaet, dtype=np.float64)  # Unix-Zeit in Sekunden
+        self.werte = np.zeros(kapazitaet, dtype=np.float64)
+        self.kapazitaet = kapazitaet
+        self.anzahl = 0
+        self.position = 0  # Nächste Schreibposition
+
+    def hinzufuegen(self, zeit, wert):
+        # Doppelte oder verspätete Messwerte verwerfen, damit der Puffer zeitlich sortiert bleibt
+        if self.anzahl and zeit <= self.zeiten[self.position - 1]:
+            return False
+        self.zeiten[self.position] = zeit
+        self.werte[self.position] = wert
+        self.position = (self.position + 1) % self.kapazitaet
+        self.anzahl = min(self.anzahl + 1, self.kapazitaet)
+        return True
+
+    def letzter(self):
+        if not self.anzahl:
+            return None
+        return self.zeiten[self.position - 1], self.werte[self.position - 1]
+
+    def fenster(self, sekunden):
+        """
+        Gibt (zeiten, werte) der letzten 'sekunden' zeitlich sortiert zurück.
+        Kopiert wird nur der angefragte Ausschnitt.
+        """
+        if not self.anzahl:
+            return np.empty(0), np.empty(0)
+        grenze = self.zeiten[self.position - 1] - sekunden
+
+        # Der Puffer besteht aus höchstens zwei sortierten Abschnitten (älterer, neuerer)
+        if self.anzahl < self.kapazitaet:
+            abschnitte = [slice(0, self.position)]
+        else:
+            abschnitte = [slice(self.position, self.kapazitaet), slice(0, self.position)]
+
+        zeiten, werte = [], []
+        for abschnitt in abschnitte:
+            # Binärsuche je Abschnitt, danach nur das Fenster kopieren
+            erster = np.searchsorted(self.zeiten[abschnitt], grenze, side="right")
+            zeiten.append(self.zeiten[abschnitt][erster:])
+            werte.append(self.werte[abschnitt][erster:])
+        return np.concatenate(zeiten), np.concatenate(werte)
+
+
+_puffer = {}
+_puffer_lock = threading.Lock()
+
+
+# Funktion zum Einspeisen eines neuen Messwerts (aufgerufen vom LISTEN/NOTIFY-Listener)
+def messwert_einspeisen(sensor_id, zeitstempel, messwert):
+    zeit = pd.Timestamp(zeitstempel).timestamp()
+    with _puffer_lock:
+        puffer = _puffer.get(sensor_id)
+        if puffer is None:
+            puffer = _puffer[sensor_id] = SensorRingPuffer()
+        return puffer.hinzufuegen(zeit, float(messwert))
+
+
+# Funktion zum Vorbefüllen der Puffer aus der Datenbank
+def puffer_vorbefuellen(box_id=SENSEBOX_ID, stunden=RINGPUFFER_VORLAUF_STUNDEN):
+    query = text("""
+        SELECT sensor_id, zeitstempel, messwert
+        FROM sensor_daten
+        WHERE box_id = :box_id
+          AND zeitstempel >= now() - make_interval(hours => :stunden)
+          AND messwert IS NOT NULL
+        ORDER BY zeitstempel
+    """)
+    with engine.connect() as conn:
+        zeilen = conn.execute(query, {"box_id": box_id, "stunden": stunden}).all()
+    for sensor_id, zeitstempel, messwert in zeilen:
+        messwert_einspeisen(sensor_id, zeitstempel, messwert)
+    return len(zeilen)
+
+
+# Funktion zum Abrufen des letzten Messwerts eines Sensors (O(1))
+def letzter_messwert(sensor_id):
+    """
+    Gibt (zeitstempel, messwert) zurück oder None, falls noch kein Wert vorliegt.
+    """
+    with _puffer_lock:
+        puffer = _puffer.get(sensor_id)
+        letzter = puffer.letzter() if puffer else None
+    if letzter is None:
+        return None
+    return pd.Timestamp(letzter[0], unit="s", tz="UTC"), float(letzter[1])
+
+
+# Funktion zum Abrufen von Minimum und Maximum der letzten Stunden (O(Fenster), ohne Datenbank)
+def min_max(sensor_id, stunden=24):
+    """
+    Gibt (minimum, maximum) der letzten 'stunden' zurück oder None, falls keine Werte vorliegen.
+    """
+    with _puffer_lock:
+        puffer = _puffer.get(sensor_id)
+        _, werte = puffer.fenster(stunden * 3600) if puffer else (None, np.empty(0))
+    if not len(werte):
+        return None
+    return float(werte.min()), float(werte.max())
+
+
+# Funktion zum Abrufen einer verdichteten Zeitreihe für Sparklines
+def sparkline(sensor_id, stunden=6, punkte=60):
+    """
+    Gibt (zeiten, werte) der letzten Stunden zurück, auf höchstens 'punkte' Mittelwerte verdichtet.
+    """
+    with _puffer_lock:
+        puffer = _puffer.get(sensor_id)
+        zeiten, werte = puffer.fenster(stunden * 3600) if puffer else (np.empty(0), np.empty(0))
+
+    if len(werte) > punkte:
+        gruppen = np.array_split(np.arange(len(werte)), punkte)
+        zeiten = np.array([zeiten[g].mean() for g in gruppen])
+        werte = np.array([werte[g].mean() for g in gruppen])
+    return pd.to_datetime(zeiten, unit="s", utc=True), werte
+
+
+# Funktion zum Abrufen der Puffer-Kennzahlen (Sensoren, Messwerte, Speicher)
+def puffer_statistik():
+    with _puffer_lock:
+        return {
+            "sensoren": len(_puffer),
+            "messwerte": sum(p.anzahl for p in _puffer.values()),
+            "bytes": sum(p.zeiten.nbytes + p.werte.nbytes for p in _puffer.values()),
+        }
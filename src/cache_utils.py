@@ -0,0 +1,139 @@
+import os
+import time
+import fcntl
+import pickle
+import hashlib
+import functools
+
+# Gemeinsames Cache-Verzeichnis aller Worker-Prozesse
+CACHE_DIR = os.getenv("CACHE_DIR", "/tmp/umwelt_cache")
+
+# Mindestabstand in Sekunden zwischen zwei Aufräumläufen eines Prozesses
+CACHE_AUFRAEUMEN_INTERVALL = 300
+
+# Sekunden nach Ablauf, in denen ein Eintrag noch ausgeliefert wird, während ein anderer Worker neu berechnet
+CACHE_VERALTET_SEKUNDEN = int(os.getenv("CACHE_VERALTET_SEKUNDEN", "600"))
+
+# Maximale Wartezeit in Sekunden auf die Berechnung eines anderen Workers (ohne veralteten Eintrag)
+CACHE_LOCK_WARTEZEIT = float(os.getenv("CACHE_LOCK_WARTEZEIT", "30"))
+
+_letztes_aufraeumen = 0.0
+
+
+# Funktion zum Bilden des Dateipfads für einen Cache-Schlüssel
+def _pfad(schluessel):
+    name = hashlib.sha1(schluessel.encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f"{name}.pkl")
+
+
+# Funktion zum Lesen eines Werts aus dem gemeinsamen Cache
+def cache_holen(schluessel, veraltet_erlaubt=False):
+    """
+    Gibt (True, wert) zurück, wenn ein gültiger Eintrag existiert, sonst (False, None).
+    Die Ablaufzeit steht im mtime der Datei, sodass abgelaufene Einträge ohne Lesen erkannt werden.
+    Mit 'veraltet_erlaubt' werden auch bis zu CACHE_VERALTET_SEKUNDEN abgelaufene Einträge geliefert.
+    """
+    pfad = _pfad(schluessel)
+    try:
+        ablauf = os.stat(pfad).st_mtime
+        if ablauf + (CACHE_VERALTET_SEKUNDEN if veraltet_erlaubt else 0) < time.time():
+            return False, None
+        with open(pfad, "rb") as f:
+            return True, pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return False, None
+
+
+# Funktion zum Schreiben eines Werts in den gemeinsamen Cache
+def cache_setzen(schluessel, wert, ttl):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    pfad = _pfad(schluessel)
+    tmp_pfad = f"{pfad}.{os.getpid()}.tmp"
+    with open(tmp_pfad, "wb") as f:
+        pickle.dump(wert, f, protocol=pickle.HIGHEST_PROTOCOL)
+    ablauf = time.time() + ttl
+    os.utime(tmp_pfad, (ablauf, ablauf))
+    os.replace(tmp_pfad, pfad)
+    _aufraeumen()
+
+
+# Funktion zum Lesen oder einmaligen Berechnen eines Werts über alle Worker hinweg
+def cache_oder_berechnen(schluessel, ttl, berechnen):
+    """
+    Liefert den zwischengespeicherten Wert oder berechnet ihn. Ein Datei-Lock sorgt dafür,
+    dass bei gleichzeitigen Anfragen nur ein Worker berechnet. Die anderen erhalten solange den
+    veralteten Eintrag oder warten höchstens CACHE_LOCK_WARTEZEIT Sekunden auf das Ergebnis.
+    """
+    gefunden, wert = cache_holen(schluessel)
+    if gefunden:
+        return wert
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(f"{_pfad(schluessel)}.lock", "w") as lock:
+        if not _lock_versuchen(lock):
+            # Ein anderer Worker berechnet gerade: veralteten Wert ausliefern statt zu blockieren
+            gefunden, wert = cache_holen(schluessel, veraltet_erlaubt=True)
+            if gefunden:
+                return wert
+            if not _lock_versuchen(lock, CACHE_LOCK_WARTEZEIT):
+                print(f"⚠️ Cache-Lock nach {CACHE_LOCK_WARTEZEIT:.0f} s nicht frei, berechne selbst.")
+                return berechnen()
+        try:
+            # Ein anderer Worker könnte den Wert inzwischen berechnet haben
+            gefunden, wert = cache_holen(schluessel)
+            if gefunden:
+                return wert
+            try:
+                wert = berechnen()
+            except Exception as e:
+                # Fehlgeschlagene Aktualisierung: noch gültigen veralteten Wert weiter verwenden
+                gefunden, veraltet = cache_holen(schluessel, veraltet_erlaubt=True)
+                if not gefunden:
+                    raise
+                print(f"⚠️ Aktualisierung fehlgeschlagen, verwende veralteten Cache-Eintrag: {e}")
+                return veraltet
+            if wert is not None:
+                cache_setzen(schluessel, wert, ttl)
+            return wert
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# Versucht das Datei-Lock zu setzen, ggf. wiederholt bis zur angegebenen Wartezeit
+def _lock_versuchen(lock, wartezeit=0.0):
+    ende = time.monotonic() + wartezeit
+    while True:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            if time.monotonic() >= ende:
+                return False
+            time.sleep(0.1)
+
+
+# Decorator: speichert das Ergebnis einer Funktion im gemeinsamen Cache
+def gecacht(ttl):
+    def decorator(funktion):
+        @functools.wraps(funktion)
+        def wrapper(*args, **kwargs):
+            schluessel = f"{funktion.__module__}.{funktion.__name__}:{args!r}:{sorted(kwargs.items())!r}"
+            return cache_oder_berechnen(schluessel, ttl, lambda: funktion(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+# Löscht abgelaufene Einträge (höchstens alle CACHE_AUFRAEUMEN_INTERVALL Sekunden)
+def _aufraeumen():
+    global _letztes_aufraeumen
+    jetzt = time.time()
+    if jetzt - _letztes_aufraeumen < CACHE_AUFRAEUMEN_INTERVALL:
+        return
+    _letztes_aufraeumen = jetzt
+
+    for eintrag in os.scandir(CACHE_DIR):
+        try:
+            if eintrag.name.endswith(".pkl") and eintrag.stat().st_mtime + CACHE_VERALTET_SEKUNDEN < jetzt:
+                os.remove(eintrag.path)
+        except FileNotFoundError:
+            pass
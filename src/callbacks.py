@@ -1,16 +1,16 @@
-from dash import Input, Output
+from dash import ALL, Input, Output, State, ctx, html, no_update
 import plotly.graph_objects as go
-from ml_utils import create_forecast, return_forecast
 from sensor_utils import (
     daten_von_api_holen,
-    daten_in_datenbank_schreiben,
     verlauf_daten_von_api_holen,
-    verlauf_in_datenbank_schreiben,
-    fetch_daily_weather_data) 
+    prognose_aus_datenbank_holen)
 import os
 from sqlalchemy import create_engine
 from cards import *
-from misc_utils import get_rain_icon, pressure_gauge_figure
+from misc_utils import get_rain_icon, pressure_gauge_figure, highlight_stats, sparkline_figure
+from buffer_utils import letzter_messwert, min_max, sparkline
+from analytics_utils import rolling_statistik
+from profiling_utils import mit_profiling
 
 # Verbindung zur Datenbank herstellen
 DB_URL = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
@@ -23,52 +23,117 @@ BOX_ID = os.getenv("SENSEBOX_ID")
 TEMP_SENSOR_ID = "67a661af4ef45d0008682745"  # Temperatur-Sensor-ID
 RAIN_SENSOR_ID = "67a7ab164ef45d00089ef795"  # Regen-Sensor-ID
 
-def init_callbacks(app):
-    @app.callback(
-        Output("countdown", "children"), # Zeigt Countdown bis zur nächsten Modell-Aktualisierung
-        Input("countdown-timer", "n_intervals"), # Aktualisiert den Countdown jede Sekunde
-        Input("daily-model-update", "n_intervals") #
-    )
-    def countdown_timer_render(n_intervals_count, _):
-        verbleibend = 180 - (n_intervals_count % 180) # 180 Sekunden = 3 Minuten
-        minuten = verbleibend // 60
-        sekunden = verbleibend % 60
-        return f"Nächste Aktualisierung in: {minuten:02}:{sekunden:02}"
+# Sensor-IDs der Highlight-Karten
+PRESSURE_SENSOR_ID = "67a661af4ef45d0008682746"  # Luftdruck
+HUMIDITY_SENSOR_ID = "67a661af4ef45d0008682748"  # Luftfeuchtigkeit
+WIND_SENSOR_ID = "67a661af4ef45d0008682749"  # Windgeschwindigkeit
+PM_SENSOR_IDS = {
+    "2.5": "67a661af4ef45d000868274b",
+    "10":  "67a661af4ef45d000868274c"
+}
 
-    # Aktualisiert die Prognose-Grafik täglich
-    @app.callback(
-        Output("forecast-graph", "children"),
-        Input("live-update", "n_intervals")
-    )
-    def update_forecast_ui(_): 
-        df = fetch_daily_weather_data(TEMP_SENSOR_ID, RAIN_SENSOR_ID)
+# Sensoren mit eigenem Live-Signal: ein neuer Messwert aktualisiert nur die Karten des betroffenen Sensors
+LIVE_SENSOR_IDS = [
+    TEMP_SENSOR_ID, RAIN_SENSOR_ID, PRESSURE_SENSOR_ID,
+    HUMIDITY_SENSOR_ID, WIND_SENSOR_ID, *PM_SENSOR_IDS.values()
+]
 
-        forecast_min = return_forecast(df, 'min_val')
-        forecast_max = return_forecast(df, 'max_val')
-        forecast_rain = return_forecast(df, 'rain_avg')
+# Aktualisierungsintervall der Prognosekarte in Millisekunden (Prognosen entstehen nur einmal täglich)
+PROGNOSE_ANZEIGE_INTERVALL = 10 * 60 * 1000
 
-        return temperatur_wochenkarte(forecast_min, forecast_max, forecast_rain)
 
-    # Lädt aktuelle Sensordaten & trainiert das Modell
-    @app.callback(
-        Output("train-dummy-output", "children"),
-        Input("daily-model-update", "n_intervals")
-    )
-    def update_forecast_model(_):
+# ID des Live-Signals eines Sensors (dcc.Store im Layout, siehe app.py)
+def sensor_signal(sensor_id):
+    return {"type": "sensor-signal", "sensor": sensor_id}
 
-        verlauf_df = verlauf_daten_von_api_holen(TEMP_SENSOR_ID)  # Temperaturverlauf
-        verlauf_in_datenbank_schreiben(verlauf_df)
+# Holt (zeitstempel, messwert) des letzten Messwerts eines Sensors aus dem Ringpuffer;
+# solange dieser leer ist (z. B. direkt nach dem Start), dient die OpenSenseMap API als Rückfall
+def letzter_wert(sensor_id):
+    letzter = letzter_messwert(sensor_id)
+    if letzter is not None:
+        return letzter
 
-        verlauf_df_rain = verlauf_daten_von_api_holen(RAIN_SENSOR_ID)  # Regenverlauf
-        verlauf_in_datenbank_schreiben(verlauf_df_rain)
+    df = daten_von_api_holen()
+    if df is None or df.empty:
+        return None
 
-        df = fetch_daily_weather_data(TEMP_SENSOR_ID, RAIN_SENSOR_ID)
+    sensor_df = df[df["sensor_id"] == sensor_id]
+    if sensor_df.empty:
+        return None
 
-        create_forecast(df, 'max_val')
-        create_forecast(df, 'rain_avg')
-        create_forecast(df, 'min_val')
+    zeile = sensor_df.sort_values("zeitstempel").iloc[-1]
+    return zeile["zeitstempel"], float(zeile["messwert"])
 
 
+def init_callbacks(app):
+    # Callbacks optional profilieren (nur bei gesetzter Umgebungsvariable PROFILING)
+    app = mit_profiling(app)
+
+    # Zeigt die Zeit seit dem letzten Live-Update an (läuft nur im Browser, ohne Server-Anfrage)
+    app.clientside_callback(
+        """
+        function(n_intervals, signal) {
+            if (!signal || !signal.empfangen) {
+                return "Warte auf neue Messwerte…";
+            }
+            var vergangen = Math.floor((Date.now() - signal.empfangen) / 1000);
+            var minuten = String(Math.floor(vergangen / 60)).padStart(2, "0");
+            var sekunden = String(vergangen % 60).padStart(2, "0");
+            return "Letzte Aktualisierung vor: " + minuten + ":" + sekunden;
+        }
+        """,
+        Output("countdown", "children"),
+        Input("countdown-timer", "n_intervals"), # Aktualisiert die Anzeige jede Sekunde
+        State("live-signal", "data")
+    )
+
+    # Verteilt ein Live-Signal nur an die Sensoren, für die neue Messwerte vorliegen
+    # (ohne Sensorliste, z. B. beim Rückfall auf periodisches Abfragen, an alle)
+    app.clientside_callback(
+        """
+        function(signal, ids) {
+            return ids.map(function (id) {
+                if (!signal.sensoren || signal.sensoren.indexOf(id.sensor) !== -1) {
+                    return signal;
+                }
+                return dash_clientside.no_update;
+            });
+        }
+        """,
+        Output(sensor_signal(ALL), "data"),
+        Input("live-signal", "data"),
+        State(sensor_signal(ALL), "id"),  # Dash 2.16 kennt clientseitig kein outputs_list
+        prevent_initial_call=True
+    )
+
+    # Zeigt die vorberechneten Prognosen aus der Tabelle 'sensor_prognose' an
+    # (berechnet täglich im Hintergrund, siehe live_utils; unabhängig vom Live-Signal)
+    @app.callback(
+        Output("forecast-graph", "children"),
+        Input("prognose-timer", "n_intervals")
+    )
+    def update_forecast_ui(_):
+        df = prognose_aus_datenbank_holen()
+
+        def prognose(sensor_id, metric):
+            auswahl = df[(df["sensor_id"] == sensor_id) & (df["metric"] == metric)]
+            return auswahl[["ds", "yhat"]]
+
+        # Nur Tage verwenden, für die alle drei Prognosen vorliegen
+        tage = (
+            prognose(TEMP_SENSOR_ID, "min_val")
+            .merge(prognose(TEMP_SENSOR_ID, "max_val"), on="ds", suffixes=("_min", "_max"))
+            .merge(prognose(RAIN_SENSOR_ID, "avg_val").rename(columns={"yhat": "yhat_rain"}), on="ds")
+        )
+        if tage.empty:
+            return html.Div("Prognose wird berechnet …", className="text-center text-muted")
+
+        forecast_min = tage[["ds", "yhat_min"]].rename(columns={"yhat_min": "yhat"})
+        forecast_max = tage[["ds", "yhat_max"]].rename(columns={"yhat_max": "yhat"})
+        forecast_rain = tage[["ds", "yhat_rain"]].rename(columns={"yhat_rain": "yhat"})
+
+        return temperatur_wochenkarte(forecast_min, forecast_max, forecast_rain)
+
     # Aktualisiert die Verlaufsgrafik basierend auf der Sensor-Auswahl im Dropdown
     @app.callback(
         Output("sensor-line-graph", "figure"),
@@ -102,135 +167,140 @@ def init_callbacks(app):
         return fig
 
 
-    # Holt aktuelle Temperaturdaten (alle 3 Minuten) und zeigt den letzten Wert an
+    # Holt aktuelle Temperaturdaten (bei jedem Live-Update) und zeigt den letzten Wert an
     @app.callback(
         Output("temperature-thermometer", "value"),
         Output("temperature-display", "children"),
-        Input("live-update", "n_intervals")
+        Input(sensor_signal(TEMP_SENSOR_ID), "data")
     )
     def update_temperature_thermometer(_):
-        df = daten_von_api_holen()
-        if df is None or df.empty:
-            return 0, "0°C"
-
-        temp_df = df[df["einheit"] == "°C"]
-        if temp_df.empty:
+        letzter = letzter_wert(TEMP_SENSOR_ID)
+        if letzter is None:
             return 0, "0°C"
 
-        letzter_wert = float(temp_df.sort_values("zeitstempel").iloc[-1]["messwert"])
-        return letzter_wert, f"{letzter_wert:.1f}°C"
+        wert = letzter[1]
+        return wert, f"{wert:.1f}°C"
     
 
     # Aktualisiert das Druckmessgerät (Gauge) mit den letzten Druckdaten
     @app.callback(
         Output("pressure-gauge", "figure"),
-        Input("live-update", "n_intervals")
+        Input(sensor_signal(PRESSURE_SENSOR_ID), "data")
     )
     def update_pressure_gauge(_):
-        df = daten_von_api_holen()
-        daten_in_datenbank_schreiben(df)
-        if df is None or df.empty:
-            return go.Figure().add_annotation(text="Keine Druckdaten", x=0.5, y=0.5, showarrow=False)
-
-        pressure_df = df[df["einheit"] == "Pa"]
-        if pressure_df.empty:
+        letzter = letzter_wert(PRESSURE_SENSOR_ID)
+        if letzter is None:
             return go.Figure().add_annotation(text="Keine Druckdaten", x=0.5, y=0.5, showarrow=False)
 
-        last_value = pressure_df.sort_values("zeitstempel").iloc[-1]["messwert"]
-        return pressure_gauge_figure(last_value)
+        return pressure_gauge_figure(letzter[1])
 
     # Aktualisiert die PM2.5 und PM10 Werte basierend auf der Auswahl im Dropdown
     @app.callback(
         Output("pm-value-display", "children"),
         Input("pm-selector", "value"),
-        Input("live-update", "n_intervals")
+        Input(sensor_signal(PM_SENSOR_IDS["2.5"]), "data"),
+        Input(sensor_signal(PM_SENSOR_IDS["10"]), "data")
     )
-    def update_pm_value(pm_type, _):
-        df = daten_von_api_holen()
-
-        if df is None or df.empty:
-            return "Keine PM-Daten"
-
-        pm_ids = {
-            "2.5": "67a661af4ef45d000868274b",
-            "10":  "67a661af4ef45d000868274c"
-        }
-
-        sensor_id = pm_ids[pm_type]
-
-        
-        df_filtered = df[df["einheit"] == "µg/m³"]
-        pm_df = df_filtered[df_filtered["sensor_id"] == sensor_id]
-
-        if pm_df.empty:
+    def update_pm_value(pm_type, *_):
+        letzter = letzter_wert(PM_SENSOR_IDS[pm_type])
+        if letzter is None:
             return f"Keine PM{pm_type} Daten"
 
-        wert = float(pm_df.sort_values("zeitstempel").iloc[-1]["messwert"])
-        return f"{wert:.1f} µg/m³"
+        return f"{letzter[1]:.1f} µg/m³"
 
     # Aktualisiert die Regenmenge und zeigt das passende Icon an
     @app.callback(
         Output("rain-value", "children"),
-        Input("live-update", "n_intervals")
+        Input(sensor_signal(RAIN_SENSOR_ID), "data")
     )
     def update_rain_value(_):
-        df = daten_von_api_holen()
-        if df is None or df.empty:
-            return "Keine Daten"
-
-        rain_df = df[df["einheit"] == "mm"]
-        if rain_df.empty:
+        letzter = letzter_wert(RAIN_SENSOR_ID)
+        if letzter is None:
             return "Keine Regendaten"
 
-        latest = rain_df.sort_values("zeitstempel").iloc[-1]["messwert"]
-        return f"{latest:.1f} mm"
+        return f"{letzter[1]:.1f} mm"
 
     # Aktualisiert die Luftfeuchtigkeit und zeigt den letzten Wert an
     @app.callback(
         Output("humidity-value", "children"),
-        Input("live-update", "n_intervals")
+        Input(sensor_signal(HUMIDITY_SENSOR_ID), "data")
     )
     def update_humidity_value(_):
-        df = daten_von_api_holen()
-        if df is None or df.empty:
-            return "Keine Daten"
-
-        humidity_df = df[df["einheit"] == "%"]
-        if humidity_df.empty:
+        letzter = letzter_wert(HUMIDITY_SENSOR_ID)
+        if letzter is None:
             return "Keine Feuchtigkeitsdaten"
 
-        latest = humidity_df.sort_values("zeitstempel").iloc[-1]["messwert"]
-        return f"{latest:.0f} %"
+        return f"{letzter[1]:.0f} %"
 
     # Aktualisiert die Windgeschwindigkeit im Gauge
     @app.callback(
         Output("wind-gauge", "value"),
-        Input("live-update", "n_intervals")
+        Input(sensor_signal(WIND_SENSOR_ID), "data")
     )
     def update_wind_gauge(_):
-        df = daten_von_api_holen()
-        if df is None or df.empty:
-            return 0, "Keine Daten"
+        letzter = letzter_wert(WIND_SENSOR_ID)
+        if letzter is None:
+            return 0
 
-        speed_df = df[df["einheit"] == "kmh"]
+        return letzter[1]
 
-        if speed_df.empty:
-            return 0, "Keine Winddaten"
+    # Zeichnet den Verlauf der letzten Stunden als Sparkline (direkt aus dem Ringpuffer)
+    @app.callback(
+        Output("rain-sparkline", "figure"),
+        Input(sensor_signal(RAIN_SENSOR_ID), "data")
+    )
+    def update_rain_sparkline(_):
+        return sparkline_figure(*sparkline(RAIN_SENSOR_ID))
 
-        speed = float(speed_df.sort_values("zeitstempel").iloc[-1]["messwert"])
+    @app.callback(
+        Output("humidity-sparkline", "figure"),
+        Input(sensor_signal(HUMIDITY_SENSOR_ID), "data")
+    )
+    def update_humidity_sparkline(_):
+        return sparkline_figure(*sparkline(HUMIDITY_SENSOR_ID))
+
+    # Zeigt gleitende 1h/24h-Kennzahlen und Anomalie-Hinweise unter den Highlight-Werten an
+    @app.callback(
+        Output("temperature-stats", "children"),
+        Output("rain-stats", "children"),
+        Output("wind-stats", "children"),
+        Output("humidity-stats", "children"),
+        Output("pressure-stats", "children"),
+        Output("pm-stats", "children"),
+        Input("pm-selector", "value"),
+        *[Input(sensor_signal(sensor_id), "data") for sensor_id in LIVE_SENSOR_IDS]
+    )
+    def update_highlight_stats(pm_type, *_):
+        stats = rolling_statistik()
+
+        # Beim ersten Aufruf alle Zeilen, danach nur die der ausgelösten Sensoren neu senden
+        ausloeser = ctx.triggered_prop_ids.values()
+        erster_aufruf = not ctx.triggered_id
+
+        def zeile(sensor_id, fmt="{:.1f}", immer=False):
+            if not (erster_aufruf or immer or sensor_signal(sensor_id) in ausloeser):
+                return no_update
+            if sensor_id not in stats.index:
+                return ""
+            return highlight_stats(stats.loc[sensor_id], fmt, spanne=min_max(sensor_id, 24))
+
+        return (
+            zeile(TEMP_SENSOR_ID),
+            zeile(RAIN_SENSOR_ID),
+            zeile(WIND_SENSOR_ID),
+            zeile(HUMIDITY_SENSOR_ID, "{:.0f}"),
+            zeile(PRESSURE_SENSOR_ID, "{:.0f}"),
+            zeile(PM_SENSOR_IDS[pm_type], immer=ctx.triggered_id == "pm-selector")
+        )
 
-        return speed
-    
     @app.callback(
     Output("last-updated-text", "children"),
-    Input("live-update", "n_intervals")
+    Input(sensor_signal(TEMP_SENSOR_ID), "data")
     )
     def update_last_updated(n):
-        df = daten_von_api_holen()
-        temp_df = df[df["einheit"] == "°C"]
-        if temp_df.empty:
+        letzter = letzter_wert(TEMP_SENSOR_ID)
+        if letzter is None:
             return "Keine Daten"
-        letzter_temp = temp_df.sort_values("zeitstempel").iloc[-1]
-        last_update = letzter_temp["zeitstempel"]
+        last_update = letzter[0]
         last_update = last_update.replace(tzinfo=ZoneInfo("UTC")).astimezone(ZoneInfo("Europe/Berlin"))
         return last_update.strftime('%d-%m-%Y %H:%M')
\ No newline at end of file
@@ -64,15 +64,7 @@ def verlauf_graph_card():
         html.Div(
             dcc.Dropdown(
                 id="sensor-dropdown",
-                options=[
-                    {"label": "Temperature (°C)", "value": "67a661af4ef45d0008682745"},
-                    {"label": "Pressure (Pa)", "value": "67a661af4ef45d0008682746"},
-                    {"label": "Rain (mm)", "value": "67a7ab164ef45d00089ef795"},
-                    {"label": "Humidity (%)", "value": "67a661af4ef45d0008682748"},
-                    {"label": "Wind speed (km/h)", "value": "67a661af4ef45d0008682749"},
-                    {"label": "PM 2.5 (µg/m³)", "value": "67a661af4ef45d000868274b"},
-                    {"label": "PM 10 (µg/m³)", "value": "67a661af4ef45d000868274c"}
-                ],
+                options=VERLAUF_SENSOREN,
                 value="67a661af4ef45d0008682745",
                 clearable=False,
             ),
@@ -226,7 +218,14 @@ def nested_cards():
                                     "display": "flex",
                                     "justifyContent": "center",
                                     "alignItems": "center",
-                                })
+                                }),
+                                html.Div(id="temperature-stats", className="highlight-stats text-center",
+                                         style={
+                                             "position": "absolute",
+                                             "bottom": "10px",
+                                             "left": "0",
+                                             "right": "0"
+                                         })
                             ],
                             style={    
                                 "minHeight": "300px",        
@@ -251,7 +250,10 @@ def nested_cards():
                                                 "marginLeft": "20px",
                                                 "color": "black",
                                                 "marginTop": "19px"
-                                            })
+                                            }),
+                                html.Div(id="rain-stats", className="highlight-stats text-center"),
+                                dcc.Graph(id="rain-sparkline", config={"displayModeBar": False, "staticPlot": True},
+                                          style={"height": "50px"})
                             ]),
                             class_name="glass-card w-100 h-100"
                         ),
@@ -286,7 +288,14 @@ def nested_cards():
                                         "zIndex": 1      
                                     }
                                 ),
-                                html.Div(style={"height": "227px"})  
+                                html.Div(style={"height": "227px"}),
+                                html.Div(id="wind-stats", className="highlight-stats text-center",
+                                         style={
+                                             "position": "absolute",
+                                             "bottom": "10px",
+                                             "left": "0",
+                                             "right": "0"
+                                         })
                             ]),
                             class_name="glass-card w-100 h-100 position-relative"
                         ),
@@ -307,7 +316,10 @@ def nested_cards():
                                                 "color": "black",
                                                 "marginTop": "19px"
 
-                                            })
+                                            }),
+                                html.Div(id="humidity-stats", className="highlight-stats text-center"),
+                                dcc.Graph(id="humidity-sparkline", config={"displayModeBar": False, "staticPlot": True},
+                                          style={"height": "50px"})
                             ]),
                             class_name="glass-card w-100 h-100"
                         ),
@@ -323,7 +335,8 @@ def nested_cards():
                                     "Pressure"
                                 ], className="card-title mb-2"),
                                 dcc.Graph(id="pressure-gauge", config={"displayModeBar": False} , 
-                                          style={"height": "235px"}) 
+                                          style={"height": "235px"}),
+                                html.Div(id="pressure-stats", className="highlight-stats text-center")
                 ]),
                             class_name="glass-card w-100 h-100"
                         ),
@@ -354,7 +367,8 @@ def nested_cards():
                                     "fontSize": "2rem",
                                     "marginLeft": "20px",
                                     "color": "black"
-                                })
+                                }),
+                            html.Div(id="pm-stats", className="highlight-stats text-center")
                         ]),
                         class_name="glass-card w-100 h-100"
                     ),
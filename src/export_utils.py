@@ -0,0 +1,189 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import timedelta
+from flask import Response, abort, request
+from sqlalchemy import text
+from sensor_utils import engine, SENSEBOX_ID, VERLAUF_SENSOREN
+
+# Zeilen je Record-Batch bzw. Parquet-Row-Group (bestimmt den Speicherbedarf eines Exports)
+EXPORT_BATCH_ZEILEN = int(os.getenv("EXPORT_BATCH_ZEILEN", "100000"))
+
+# Zeitraum in Tagen, wenn kein Startzeitpunkt angegeben ist
+EXPORT_STANDARD_TAGE = 7
+
+# Spalten des Exports in fester Reihenfolge
+EXPORT_SCHEMA = pa.schema([
+    ("zeitstempel", pa.timestamp("us", tz="UTC")),
+    ("box_id", pa.string()),
+    ("sensor_id", pa.string()),
+    ("messwert", pa.float64()),
+])
+
+# Dateiendung und Mimetype je Exportformat
+EXPORT_FORMATE = {
+    "arrow": ("arrows", "application/vnd.apache.arrow.stream"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+# Sortiert nach Zeit, damit ein Export ab dem letzten empfangenen Zeitstempel fortgesetzt werden kann
+QUERY_EXPORT = text("""
+    SELECT zeitstempel, box_id, sensor_id, messwert
+    FROM sensor_verlauf
+    WHERE box_id = :box_id
+      AND sensor_id = ANY(:sensor_ids)
+      AND zeitstempel >= :von
+      AND zeitstempel < :bis
+      AND (CAST(:nach AS TIMESTAMPTZ) IS NULL OR zeitstempel > :nach)
+    ORDER BY zeitstempel, sensor_id
+""")
+
+
+# Funktion zum Umwandeln von Zeilen in einen Record-Batch
+def _record_batch(zeilen):
+    spalten = list(zip(*zeilen))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(werte, type=feld.type) for werte, feld in zip(spalten, EXPORT_SCHEMA)],
+        schema=EXPORT_SCHEMA
+    )
+
+
+# Funktion zum Lesen eines Zeitraums als Folge von Arrow-Record-Batches
+def verlauf_batches(sensor_ids, von, bis, box_id=SENSEBOX_ID, nach=None, batch_zeilen=EXPORT_BATCH_ZEILEN):
+    """
+    Liest 'sensor_verlauf' über einen serverseitigen Cursor und liefert Record-Batches mit
+    höchstens 'batch_zeilen' Zeilen (außer bei mehr Messwerten je Zeitstempel). Ein Batch endet
+    immer mit allen Messwerten seines letzten Zeitstempels; ein abgebrochener Arrow-Stream lässt
+    sich daher mit 'nach' = letzter empfangener Zeitstempel lückenlos fortsetzen (bei Parquet nur
+    als neue Datei ab einem vollständig geschriebenen Export, siehe verlauf_exportieren).
+    """
+    params = {"box_id": box_id, "sensor_ids": list(sensor_ids), "von": von, "bis": bis, "nach": nach}
+    rest = []
+    with engine.connect() as conn:
+        ergebnis = conn.execution_options(stream_results=True, max_row_buffer=batch_zeilen).execute(
+            QUERY_EXPORT, params
+        )
+        for teil in ergebnis.partitions(batch_zeilen):
+            zeilen = rest + teil
+            # Am letzten Wechsel des Zeitstempels trennen, der Rest wandert in den nächsten Batch
+            letzter = zeilen[-1][0]
+            schnitt = len(zeilen)
+            while schnitt > 0 and zeilen[schnitt - 1][0] == letzter:
+                schnitt -= 1
+            if schnitt == 0:
+                rest = zeilen
+                continue
+            rest = zeilen[schnitt:]
+            yield _record_batch(zeilen[:schnitt])
+
+    if rest:
+        yield _record_batch(rest)
+
+
+# Dateiähnliches Ziel, das geschriebene Bytes bis zum nächsten Abholen sammelt
+class _StromPuffer:
+    def __init__(self):
+        self.teile = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, daten):
+        daten = bytes(daten)
+        self.teile.append(daten)
+        self.position += len(daten)
+        return len(daten)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def abholen(self):
+        daten = b"".join(self.teile)
+        self.teile = []
+        return daten
+
+
+# Funktion zum Erzeugen eines Writers für das gewählte Format
+def _writer(ziel, format):
+    if format == "parquet":
+        return pq.ParquetWriter(ziel, EXPORT_SCHEMA, compression="zstd")
+    return pa.ipc.new_stream(ziel, EXPORT_SCHEMA)
+
+
+# Funktion zum Streamen eines Exports als Bytes (für HTTP-Antworten)
+def verlauf_export_streamen(sensor_ids, von, bis, format="arrow", box_id=SENSEBOX_ID, nach=None):
+    """
+    Liefert den Export als Folge von Byte-Blöcken, je Record-Batch bzw. Row-Group einer.
+    Es liegt immer nur ein Batch im Speicher. Bei Parquet folgt der Footer erst im letzten Block.
+    """
+    puffer = _StromPuffer()
+    writer = _writer(puffer, format)
+    for batch in verlauf_batches(sensor_ids, von, bis, box_id, nach):
+        writer.write_batch(batch)
+        yield puffer.abholen()
+    writer.close()
+    yield puffer.abholen()
+
+
+# Funktion zum Exportieren eines Zeitraums in eine Datei (Python-API)
+def verlauf_exportieren(pfad, sensor_ids, von, bis, format=None, box_id=SENSEBOX_ID, nach=None):
+    """
+    Schreibt den Export nach 'pfad' (Format aus der Endung, sofern nicht angegeben) und gibt
+    den letzten geschriebenen Zeitstempel zurück, mit dem sich ein Folge-Export per 'nach' anschließt.
+    """
+    format = format or ("parquet" if pfad.endswith(".parquet") else "arrow")
+    letzter = nach
+    with open(pfad, "wb") as f, _writer(f, format) as writer:
+        for batch in verlauf_batches(sensor_ids, von, bis, box_id, nach):
+            writer.write_batch(batch)
+            letzter = batch.column("zeitstempel")[-1].as_py()
+    return letzter
+
+
+# Funktion zum Lesen eines Zeitpunkts aus den Anfrageparametern
+def _zeitpunkt(name, standard=None):
+    wert = request.args.get(name)
+    if not wert:
+        return standard
+    try:
+        zeitpunkt = pd.Timestamp(wert)
+    except ValueError:
+        abort(400, f"Ungültiger Zeitpunkt für '{name}': {wert}")
+    # Zeitpunkte ohne Zeitzone gelten als UTC
+    return zeitpunkt.tz_localize("UTC") if zeitpunkt.tzinfo is None else zeitpunkt.tz_convert("UTC")
+
+
+def init_export(app):
+    """
+    Registriert /export/verlauf, z. B.
+    /export/verlauf?sensor=<id>&sensor=<id>&von=2024-01-01&bis=2024-07-01&format=parquet
+    Ohne 'sensor' werden alle Sensoren des Verlaufsgraphen exportiert. Zum Fortsetzen
+    eines abgebrochenen Arrow-Exports 'nach' auf den letzten empfangenen Zeitstempel setzen.
+    Parquet lässt sich nicht fortsetzen: der Footer steht am Dateiende, eine abgebrochene
+    Datei ist daher unlesbar und muss vollständig neu angefordert werden.
+    """
+    @app.server.route("/export/verlauf")
+    def export_verlauf():
+        format = request.args.get("format", "arrow")
+        if format not in EXPORT_FORMATE:
+            abort(400, f"Unbekanntes Format: {format}")
+
+        sensor_ids = request.args.getlist("sensor") or [sensor["value"] for sensor in VERLAUF_SENSOREN]
+        bis = _zeitpunkt("bis", pd.Timestamp.now(tz="UTC"))
+        von = _zeitpunkt("von", bis - timedelta(days=EXPORT_STANDARD_TAGE))
+        nach = _zeitpunkt("nach")
+        box_id = request.args.get("box_id", SENSEBOX_ID)
+
+        endung, mimetype = EXPORT_FORMATE[format]
+        dateiname = f"verlauf_{von:%Y%m%dT%H%M%S}_{bis:%Y%m%dT%H%M%S}.{endung}"
+        return Response(
+            verlauf_export_streamen(sensor_ids, von, bis, format, box_id, nach),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename={dateiname}"}
+        )
@@ -0,0 +1,22 @@
+import os
+
+# Gunicorn-Konfiguration für den Produktivbetrieb (Werte per Umgebungsvariable anpassbar)
+bind = f"0.0.0.0:{os.getenv('PORT', '8050')}"
+
+# Mehrere Prozesse mit je mehreren Threads: ein langsamer Callback blockiert nicht alle Clients.
+# Jede offene SSE-Verbindung (/stream) belegt dauerhaft einen Thread. Höchstens SSE_MAX_VERBINDUNGEN
+# (Standard: die Hälfte der Threads) je Worker werden angenommen, der Rest bleibt für Callbacks frei;
+# weitere Tabs aktualisieren sich per Abfrage. Für mehr Live-Clients Worker oder Threads erhöhen.
+workers = int(os.getenv("GUNICORN_WORKERS", "3"))
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+worker_class = "gthread"
+
+# Die App wird erst nach dem Fork geladen, damit jeder Worker eigene Hintergrund-Threads startet
+preload_app = False
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 75
+
+accesslog = "-"
+errorlog = "-"
@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import queue
+import select
+import threading
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from flask import Response, stream_with_context
+from sensor_utils import db_url, daten_von_api_holen, daten_in_datenbank_schreiben, SENSEBOX_ID
+from ml_utils import create_all_forecasts
+from buffer_utils import messwert_einspeisen, puffer_vorbefuellen
+
+# Kanal, auf dem der Trigger in init.sql neue Messwerte meldet
+NOTIFY_KANAL = "sensor_daten_neu"
+
+# Abrufintervall der OpenSenseMap API in Sekunden (ein Abruf pro Deployment, unabhängig von der Anzahl der Clients)
+INGEST_INTERVALL = int(os.getenv("INGEST_INTERVALL", "30"))
+
+# Schlüssel für das Advisory-Lock, damit nur ein Prozess die API abfragt
+INGEST_LOCK_ID = 4711
+
+# Abstand in Sekunden zwischen zwei Prognose-Läufen und Prüfintervall dafür
+PROGNOSE_INTERVALL = int(os.getenv("PROGNOSE_INTERVALL", "86400"))
+PROGNOSE_PRUEF_INTERVALL = 600
+
+# Schlüssel für das Advisory-Lock des Prognose-Laufs
+PROGNOSE_LOCK_ID = 4712
+
+# Sekunden ohne Ereignis, nach denen ein Keepalive-Kommentar an die Clients geht
+HEARTBEAT_INTERVALL = 15
+
+# Höchstzahl gleichzeitiger SSE-Verbindungen je Worker. Jede Verbindung belegt einen gunicorn-Thread;
+# die übrigen Threads bleiben für die Dash-Callbacks frei. Weitere Clients erhalten 503 und fragen periodisch ab.
+SSE_MAX_VERBINDUNGEN = int(os.getenv(
+    "SSE_MAX_VERBINDUNGEN", str(max(1, int(os.getenv("GUNICORN_THREADS", "16")) // 2))
+))
+
+# Wartezeit, um die Benachrichtigungen eines Einfüge-Batches zu einem Ereignis zusammenzufassen
+BUENDEL_WARTEZEIT = 0.3
+
+_abonnenten = set()
+_abonnenten_lock = threading.Lock()
+_gestartet = False
+
+
+# Funktion zum Verteilen eines Ereignisses an alle verbundenen Browser
+def _verteilen(messungen):
+    sensoren = {m["sensor_id"] for m in messungen}
+    with _abonnenten_lock:
+        for warteschlange in list(_abonnenten):
+            try:
+                warteschlange.put_nowait({"zeit": time.time(), "sensoren": sorted(sensoren)})
+            except queue.Full:
+                # Der Client hat noch ein ausstehendes Update: Sensoren zusammenführen, damit keiner verloren geht.
+                # Nur hier wird (unter dem Lock) eingereiht, nach dem Herausnehmen ist also wieder Platz.
+                try:
+                    ausstehend = set(warteschlange.get_nowait()["sensoren"])
+                except queue.Empty:
+                    ausstehend = set()  # Inzwischen vom Client abgeholt
+                warteschlange.put_nowait({"zeit": time.time(), "sensoren": sorted(ausstehend | sensoren)})
+
+
+# Funktion zum Lauschen auf neue Messwerte (LISTEN/NOTIFY)
+def _listener_schleife():
+    """
+    Wartet blockierend auf Benachrichtigungen der Datenbank, speist die Messwerte in die
+    Ringpuffer ein und verteilt sie an die Clients. Ohne neue Messwerte verbraucht die
+    Schleife keine CPU.
+    """
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(db_url, keepalives=1, keepalives_idle=30)
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {NOTIFY_KANAL};")
+
+            # Erst nach LISTEN vorbefüllen, damit zwischendurch eintreffende Werte nicht verloren gehen
+            puffer_vorbefuellen()
+
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                time.sleep(BUENDEL_WARTEZEIT)
+                conn.poll()
+
+                messungen = [json.loads(n.payload) for n in conn.notifies]
+                conn.notifies.clear()
+                for m in messungen:
+                    if m.get("messwert") is not None:
+                        messwert_einspeisen(m["sensor_id"], m["zeitstempel"], m["messwert"])
+                if messungen:
+                    _verteilen(messungen)
+        except Exception as e:
+            print(f"⚠️ Live-Listener unterbrochen: {e}")
+            time.sleep(5)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+# Funktion zum regelmäßigen Abrufen der aktuellen Sensordaten
+def _ingestion_schleife():
+    """
+    Fragt die OpenSenseMap API ab und schreibt neue Messwerte in die Datenbank.
+    Ein Advisory-Lock sorgt dafür, dass bei mehreren Prozessen nur einer abfragt;
+    fällt dieser aus, übernimmt ein anderer.
+    """
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(db_url, keepalives=1, keepalives_idle=30)
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s);", (INGEST_LOCK_ID,))
+                hat_lock = cur.fetchone()[0]
+
+            if not hat_lock:
+                conn.close()
+                conn = None
+                time.sleep(INGEST_INTERVALL)
+                continue
+
+            while True:
+                df = daten_von_api_holen()
+                daten_in_datenbank_schreiben(df)
+                time.sleep(INGEST_INTERVALL)
+        except Exception as e:
+            print(f"⚠️ Datenabruf fehlgeschlagen: {e}")
+            time.sleep(INGEST_INTERVALL)
+        finally:
+            # Schließen der Verbindung gibt das Advisory-Lock frei
+            if conn is not None:
+                conn.close()
+
+
+# Funktion zum täglichen Berechnen aller Prognosen
+def _prognose_schleife():
+    """
+    Prüft regelmäßig, ob die Prognosen in 'sensor_prognose' älter als PROGNOSE_INTERVALL sind,
+    und berechnet sie dann neu. Das Advisory-Lock verhindert parallele Läufe in mehreren Prozessen.
+    """
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(db_url, keepalives=1, keepalives_idle=30)
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s);", (PROGNOSE_LOCK_ID,))
+                if cur.fetchone()[0]:
+                    cur.execute(
+                        "SELECT EXTRACT(EPOCH FROM now() - max(erstellt_am)) FROM sensor_prognose WHERE box_id = %s;",
+                        (SENSEBOX_ID,)
+                    )
+                    alter = cur.fetchone()[0]
+                    if alter is None or alter >= PROGNOSE_INTERVALL:
+                        create_all_forecasts()
+        except Exception as e:
+            print(f"⚠️ Prognose-Lauf fehlgeschlagen: {e}")
+        finally:
+            # Schließen der Verbindung gibt das Advisory-Lock frei
+            if conn is not None:
+                conn.close()
+        time.sleep(PROGNOSE_PRUEF_INTERVALL)
+
+
+# Funktion zum Erzeugen des Server-Sent-Events-Streams für einen Client
+def _ereignis_strom(warteschlange):
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                ereignis = warteschlange.get(timeout=HEARTBEAT_INTERVALL)
+                yield f"data: {json.dumps(ereignis)}\n\n"
+            except queue.Empty:
+                yield ": ping\n\n"
+    finally:
+        with _abonnenten_lock:
+            _abonnenten.discard(warteschlange)
+
+
+def init_live_updates(app):
+    """
+    Registriert den SSE-Endpunkt /stream und startet Listener, Datenabruf und
+    Prognose-Lauf im Hintergrund.
+    """
+    global _gestartet
+
+    @app.server.route("/stream")
+    def stream():
+        warteschlange = queue.Queue(maxsize=1)
+        with _abonnenten_lock:
+            if len(_abonnenten) >= SSE_MAX_VERBINDUNGEN:
+                # Browser fällt auf periodisches Abfragen zurück (siehe assets/live_updates.js)
+                return Response("Zu viele Live-Verbindungen", status=503, headers={"Retry-After": "60"})
+            _abonnenten.add(warteschlange)
+        return Response(
+            stream_with_context(_ereignis_strom(warteschlange)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    if _gestartet:
+        return
+    _gestartet = True
+
+    threading.Thread(target=_listener_schleife, name="live-listener", daemon=True).start()
+    if os.getenv("INGEST_AKTIV", "1") == "1":
+        threading.Thread(target=_ingestion_schleife, name="live-ingestion", daemon=True).start()
+    if os.getenv("PROGNOSE_AKTIV", "1") == "1":
+        threading.Thread(target=_prognose_schleife, name="prognose-lauf", daemon=True).start()
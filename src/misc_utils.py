@@ -37,3 +37,44 @@ def pressure_gauge_figure(pressure_value):
         height=220
     )
     return fig
+
+# Erstellt eine kleine Sparkline (ohne Achsen) für den Verlauf der letzten Stunden
+def sparkline_figure(zeiten, werte):
+    fig = go.Figure(go.Scatter(
+        x=zeiten,
+        y=werte,
+        mode="lines",
+        line=dict(color="black", width=1.5),
+        hoverinfo="skip"
+    ))
+    # Ohne Template (sonst wird das komplette Plotly-Standardtemplate mit jedem Tick übertragen)
+    fig.update_layout(
+        template="none",
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        margin=dict(t=0, b=0, l=0, r=0),
+        height=50,
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False)
+    )
+    return fig
+
+# Erstellt die Kennzahlen-Zeile (gleitendes 1h/24h-Mittel, 24h-Spanne, Anomalie-Hinweis) für eine Highlight-Karte;
+# 'spanne' (Minimum, Maximum) stammt aus dem Ringpuffer, sonst aus den Kennzahlen der Datenbank
+def highlight_stats(stats, fmt="{:.1f}", spanne=None):
+    if stats is None:
+        return ""
+
+    minimum, maximum = spanne or (stats['min_24h'], stats['max_24h'])
+    text = (
+        f"1h Ø {fmt.format(stats['mittel_1h'])} · "
+        f"24h Ø {fmt.format(stats['mittel_24h'])} "
+        f"({fmt.format(minimum)} – {fmt.format(maximum)})"
+    )
+    kinder = [html.Span(text)]
+    if stats["anomalie"]:
+        kinder.append(html.Span(
+            f"Anomaly (z = {stats['z_score']:+.1f})",
+            className="badge bg-danger ms-2"
+        ))
+    return kinder
@@ -1,6 +1,15 @@
 import os
-from prophet import Prophet
-import pickle
+import json
+import time
+import numpy as np
+import pandas as pd
+from model_store import modell_speichern, modell_laden
+from sensor_utils import (
+    VERLAUF_SENSOREN,
+    verlauf_daten_von_api_holen,
+    verlauf_in_datenbank_schreiben,
+    fetch_daily_sensor_data,
+    prognose_in_datenbank_schreiben)
 
 # Umgebungsvariablen für die Datenbankverbindung
 DB_USER = os.getenv("DB_USER", "gruppeeins")
@@ -12,34 +21,342 @@ DB_NAME = os.getenv("DB_NAME", "umwelt_db")
 # SenseBox-ID (von OpenSenseMap)
 SENSEBOX_ID = os.getenv("SENSEBOX_ID", "67a661af4ef45d0008682744")
 
+# Standard-Backend für die Prognose ("prophet", "ridge" oder "naive")
+FORECAST_BACKEND = os.getenv("FORECAST_BACKEND", "prophet")
 
-def create_forecast(df, value_column='min_val', days_ahead=7):
-    # Wählt die Spalten 'datum' und die angegebene Wertspalte aus, benennt sie für Prophet um
-    df_prophet = df[['datum', value_column]].rename(columns={'datum': 'ds', value_column: 'y'})
-    
-    # Entfernt Zeilen mit fehlenden Werten
-    df_prophet.dropna(inplace=True)
+# Tageskennzahlen, die für jeden Sensor prognostiziert werden
+PROGNOSE_METRIKEN = ['min_val', 'max_val', 'avg_val']
 
-    # Erstellt ein Prophet-Modell mit täglicher Saisonalität
-    model = Prophet(daily_seasonality=True)
-    
-    # Trainiert das Modell 
-    model.fit(df_prophet)
+# z-Wert für das 80-%-Prognoseintervall (entspricht Prophets Standard interval_width=0.8)
+INTERVALL_Z = 1.2816
 
-    # Speichert das trainierte Modell in einer Datei zur späteren Nutzung
-    with open(f'model_{value_column}.pkl', 'wb') as f:
-        pickle.dump(model, f)
 
-def return_forecast(df, value_column='min_val', days_ahead=7):
-    # Lädt das gespeicherte Modell aus der Datei
-    with open(f'model_{value_column}.pkl', 'rb') as f:
-        model = pickle.load(f)
+# Prophet-Backend (langsam beim Training, liefert Trend und Wochen-/Jahressaisonalität)
+class ProphetForecaster:
+    name = "prophet"
 
-    # Erstellt ein DataFrame mit zukünftigen Zeitpunkten, für die eine Prognose gemacht wird
-    future = model.make_future_dataframe(periods=days_ahead)
+    def fit(self, df):
+        # Import erst hier, damit die leichten Backends ohne Prophet/Stan auskommen
+        from prophet import Prophet
 
-    # Führt die Vorhersage mit dem geladenen Modell durch
-    forecast = model.predict(future)
+        # Tägliche Saisonalität ist bei Tageswerten bedeutungslos und kostet nur Rechenzeit
+        self.model = Prophet(daily_seasonality=False)
+        self.model.fit(df)
+        return self
 
-    # Gibt die letzten 'days_ahead' Tage der Vorhersage zurück (mit Datum und Prognosewert)
-    return forecast[['ds', 'yhat']].tail(days_ahead)
\ No newline at end of file
+    def predict(self, days_ahead=7):
+        future = self.model.make_future_dataframe(periods=days_ahead)
+        forecast = self.model.predict(future)
+        return forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(days_ahead).reset_index(drop=True)
+
+    def to_dict(self):
+        from prophet.serialize import model_to_json
+        return {"prophet": json.loads(model_to_json(self.model))}
+
+    @classmethod
+    def from_dict(cls, daten):
+        from prophet.serialize import model_from_json
+        forecaster = cls()
+        forecaster.model = model_from_json(json.dumps(daten["prophet"]))
+        return forecaster
+
+
+# Saisonal-naives Backend: Wert von vor einer Woche (bzw. letzter Wert bei zu kurzer Historie)
+class SeasonalNaiveForecaster:
+    name = "naive"
+
+    def __init__(self, season=7):
+        self.season = season
+
+    def fit(self, df):
+        self.ds, self.y = _tagesreihe(df)
+        # Streuung der saisonalen Differenzen für das Prognoseintervall
+        differenzen = self.y[self.season:] - self.y[:-self.season]
+        self.sigma = float(differenzen.std()) if len(differenzen) > 1 else 0.0
+        return self
+
+    def predict(self, days_ahead=7):
+        if len(self.y) >= self.season:
+            letzte_saison = self.y[-self.season:]
+            yhat = np.resize(letzte_saison, days_ahead)
+        else:
+            yhat = np.full(days_ahead, self.y[-1])
+        # Unsicherheit wächst mit jeder weiteren Saison, die in die Zukunft geschaut wird
+        saisons = np.ceil(np.arange(1, days_ahead + 1) / self.season)
+        return _prognose_frame(self.ds[-1], yhat, self.sigma * np.sqrt(saisons))
+
+    def to_dict(self):
+        # Für die Prognose reichen die letzte Saison, das letzte Datum und die Streuung
+        return {
+            "season": self.season,
+            "y": self.y[-self.season:].tolist(),
+            "letztes_datum": _datum_text(self.ds[-1]),
+            "sigma": self.sigma,
+        }
+
+    @classmethod
+    def from_dict(cls, daten):
+        forecaster = cls(season=daten["season"])
+        forecaster.y = np.array(daten["y"], dtype=float)
+        forecaster.ds = np.array([np.datetime64(daten["letztes_datum"])])
+        forecaster.sigma = daten.get("sigma", 0.0)
+        return forecaster
+
+
+# Ridge-Regression auf Lag-Features und Wochentag (reines NumPy, trainiert in Millisekunden)
+class RidgeLagForecaster:
+    name = "ridge"
+
+    def __init__(self, lags=7, alpha=1.0):
+        self.lags = lags
+        self.alpha = alpha
+
+    def _features(self, lag_werte, wochentag):
+        # Achsenabschnitt, Lags (neuester zuerst) und Wochentag als One-Hot (Montag = Referenz)
+        dow = np.zeros(6)
+        if wochentag > 0:
+            dow[wochentag - 1] = 1.0
+        return np.concatenate(([1.0], lag_werte, dow))
+
+    def fit(self, df):
+        self.ds, self.y = _tagesreihe(df)
+        self.mittel = self.y.mean()
+        y = self.y - self.mittel
+
+        # Bei sehr kurzer Historie weniger Lags verwenden
+        self.lags = max(1, min(self.lags, len(y) // 2))
+        wochentage = pd.DatetimeIndex(self.ds).dayofweek
+
+        X = np.array([
+            self._features(y[t - self.lags:t][::-1], wochentage[t])
+            for t in range(self.lags, len(y))
+        ])
+        ziel = y[self.lags:]
+
+        if len(ziel) == 0:
+            self.gewichte = None
+            self.sigma = 0.0
+            return self
+
+        strafe = self.alpha * np.eye(X.shape[1])
+        strafe[0, 0] = 0.0  # Achsenabschnitt nicht bestrafen
+        self.gewichte = np.linalg.solve(X.T @ X + strafe, X.T @ ziel)
+
+        # Streuung der In-Sample-Residuen für das Prognoseintervall
+        self.sigma = float((ziel - X @ self.gewichte).std())
+        return self
+
+    def predict(self, days_ahead=7):
+        if self.gewichte is None:
+            return _prognose_frame(self.ds[-1], np.full(days_ahead, self.y[-1]), np.zeros(days_ahead))
+
+        verlauf = list(self.y[-self.lags:] - self.mittel)
+        start = pd.Timestamp(self.ds[-1])
+        yhat = []
+        # Rekursive Mehrschritt-Prognose: jede Vorhersage wird zum Lag des nächsten Tages
+        for schritt in range(1, days_ahead + 1):
+            wochentag = (start + pd.Timedelta(days=schritt)).dayofweek
+            x = self._features(np.array(verlauf[::-1][:self.lags]), wochentag)
+            wert = float(x @ self.gewichte)
+            yhat.append(wert)
+            verlauf.append(wert)
+        # Bei rekursiver Prognose summieren sich die Fehler der einzelnen Schritte
+        streuung = self.sigma * np.sqrt(np.arange(1, days_ahead + 1))
+        return _prognose_frame(self.ds[-1], np.array(yhat) + self.mittel, streuung)
+
+    def to_dict(self):
+        # Nur die Parameter und die letzten Lag-Werte, keine Trainingshistorie
+        return {
+            "lags": self.lags,
+            "alpha": self.alpha,
+            "mittel": float(self.mittel),
+            "gewichte": None if self.gewichte is None else self.gewichte.tolist(),
+            "y": self.y[-self.lags:].tolist(),
+            "letztes_datum": _datum_text(self.ds[-1]),
+            "sigma": self.sigma,
+        }
+
+    @classmethod
+    def from_dict(cls, daten):
+        forecaster = cls(lags=daten["lags"], alpha=daten["alpha"])
+        forecaster.mittel = daten["mittel"]
+        forecaster.gewichte = None if daten["gewichte"] is None else np.array(daten["gewichte"])
+        forecaster.y = np.array(daten["y"], dtype=float)
+        forecaster.ds = np.array([np.datetime64(daten["letztes_datum"])])
+        forecaster.sigma = daten.get("sigma", 0.0)
+        return forecaster
+
+
+# Verfügbare Prognose-Backends
+FORECASTERS = {
+    ProphetForecaster.name: ProphetForecaster,
+    SeasonalNaiveForecaster.name: SeasonalNaiveForecaster,
+    RidgeLagForecaster.name: RidgeLagForecaster,
+}
+
+
+# Funktion zum Erzeugen eines Prognose-Backends anhand seines Namens
+def get_forecaster(backend=None):
+    backend = backend or FORECAST_BACKEND
+    if backend not in FORECASTERS:
+        raise ValueError(f"Unbekanntes Prognose-Backend: {backend} (verfügbar: {', '.join(FORECASTERS)})")
+    return FORECASTERS[backend]()
+
+
+# Wandelt Tageswerte in eine lückenlose Tagesreihe um (fehlende Tage werden interpoliert)
+def _tagesreihe(df):
+    serie = df.set_index(pd.to_datetime(df['ds']))['y'].sort_index()
+    serie = serie[~serie.index.duplicated(keep='last')]
+    serie = serie.asfreq('D').interpolate(limit_direction='both')
+    return serie.index.values, serie.values.astype(float)
+
+
+# Baut das Ergebnis-DataFrame (ds, yhat, yhat_lower, yhat_upper) für die Tage nach dem letzten Trainingsdatum
+def _prognose_frame(letztes_datum, yhat, streuung):
+    ds = pd.date_range(pd.Timestamp(letztes_datum) + pd.Timedelta(days=1), periods=len(yhat), freq='D')
+    return pd.DataFrame({
+        'ds': ds,
+        'yhat': yhat,
+        'yhat_lower': yhat - INTERVALL_Z * streuung,
+        'yhat_upper': yhat + INTERVALL_Z * streuung,
+    })
+
+
+# Datum als ISO-Text (YYYY-MM-DD) für die JSON-Serialisierung
+def _datum_text(datum):
+    return pd.Timestamp(datum).strftime('%Y-%m-%d')
+
+
+# Stellt ein Modell aus seiner JSON-Darstellung wieder her
+def _modell_aus_dict(daten):
+    return FORECASTERS[daten["backend"]].from_dict(daten["parameter"])
+
+
+# Bereitet die Tageswerte für die Backends vor (Spalten 'ds' und 'y')
+def _trainingsdaten(df, value_column):
+    df_train = df[['datum', value_column]].rename(columns={'datum': 'ds', value_column: 'y'})
+    return df_train.dropna()
+
+
+def create_forecast(df, value_column='min_val', days_ahead=7, backend=None, model_name=None):
+    # Wählt die Spalten 'datum' und die angegebene Wertspalte aus und entfernt fehlende Werte
+    df_train = _trainingsdaten(df, value_column)
+    if df_train.empty:
+        print(f"⚠️ Keine Trainingsdaten für {value_column}.")
+        return None
+
+    # Erstellt und trainiert das gewählte Prognose-Backend
+    start = time.perf_counter()
+    model = get_forecaster(backend).fit(df_train)
+    fit_sekunden = time.perf_counter() - start
+
+    # Speichert das trainierte Modell als neue Version im Modellspeicher
+    datum = pd.to_datetime(df_train['ds'])
+    return modell_speichern(
+        model_name or f"model_{value_column}",
+        {"backend": model.name, "parameter": model.to_dict()},
+        {
+            "backend": model.name,
+            "value_column": value_column,
+            "trainingszeilen": len(df_train),
+            "fit_sekunden": round(fit_sekunden, 4),
+            "daten_von": datum.min().strftime('%Y%m%d'),
+            "daten_bis": datum.max().strftime('%Y%m%d'),
+        }
+    )
+
+
+# Funktion zum Trainieren und Vorhersagen aller Tageskennzahlen eines Sensors
+def _sensor_prognosen(sensor_id, box_id, days_ahead, backend):
+    verlauf_in_datenbank_schreiben(verlauf_daten_von_api_holen(sensor_id, box_id))
+    df = fetch_daily_sensor_data(sensor_id, box_id)
+
+    prognosen = []
+    for metric in PROGNOSE_METRIKEN:
+        model_name = f"model_{sensor_id}_{metric}"
+        if create_forecast(df, metric, days_ahead, backend, model_name=model_name) is None:
+            continue
+
+        model, meta = modell_laden(model_name, _modell_aus_dict)
+        forecast = model.predict(days_ahead)
+        forecast['box_id'] = box_id
+        forecast['sensor_id'] = sensor_id
+        forecast['metric'] = metric
+        forecast['model_version'] = meta['version']
+        prognosen.append(forecast)
+    return prognosen
+
+
+# Funktion zum Berechnen aller Prognosen in einem Durchlauf
+def create_all_forecasts(sensor_ids=None, box_id=SENSEBOX_ID, days_ahead=7, backend=None):
+    """
+    Aktualisiert die Verlaufsdaten aller Sensoren des Verlaufsgraphen, trainiert je Sensor und
+    Tageskennzahl ein Modell und schreibt alle Prognosen gesammelt in die Tabelle 'sensor_prognose'.
+    """
+    sensor_ids = sensor_ids or [sensor["value"] for sensor in VERLAUF_SENSOREN]
+    prognosen = []
+
+    for sensor_id in sensor_ids:
+        # Ein fehlerhafter Sensor (API, Daten, Training) soll die übrigen Prognosen nicht verhindern
+        try:
+            prognosen.extend(_sensor_prognosen(sensor_id, box_id, days_ahead, backend))
+        except Exception as e:
+            print(f"⚠️ Prognose für Sensor {sensor_id} fehlgeschlagen: {e}")
+
+    if not prognosen:
+        print("⚠️ Keine Prognosen berechnet.")
+        return
+
+    prognose_in_datenbank_schreiben(pd.concat(prognosen, ignore_index=True))
+
+
+# Funktion zum Vergleich der Backends (Genauigkeit und Laufzeit)
+def backtest_forecasters(df, value_column='min_val', backends=None, days_ahead=7, folds=3):
+    """
+    Rolling-Origin-Backtest: trainiert jedes Backend auf den Daten bis zu einem Stichtag
+    und vergleicht die Prognose der folgenden 'days_ahead' Tage mit den echten Werten.
+    """
+    df_train = _trainingsdaten(df, value_column).sort_values('ds').reset_index(drop=True)
+    df_train['ds'] = pd.to_datetime(df_train['ds'])
+    backends = backends or list(FORECASTERS)
+
+    ergebnisse = []
+    for backend in backends:
+        fehler, fit_zeiten, predict_zeiten = [], [], []
+        for fold in range(folds, 0, -1):
+            stichtag = len(df_train) - fold * days_ahead
+            if stichtag < 2 * days_ahead:
+                continue
+            train, test = df_train.iloc[:stichtag], df_train.iloc[stichtag:stichtag + days_ahead]
+
+            start = time.perf_counter()
+            model = get_forecaster(backend).fit(train)
+            fit_zeiten.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            prognose = model.predict(days_ahead)
+            predict_zeiten.append(time.perf_counter() - start)
+
+            vergleich = test.merge(prognose, on='ds', how='inner')
+            fehler.extend(vergleich['yhat'] - vergleich['y'])
+
+        fehler = np.array(fehler, dtype=float)
+        ergebnisse.append({
+            'backend': backend,
+            'folds': len(fit_zeiten),
+            'mae': np.abs(fehler).mean() if len(fehler) else np.nan,
+            'rmse': np.sqrt((fehler ** 2).mean()) if len(fehler) else np.nan,
+            'fit_s': np.mean(fit_zeiten) if fit_zeiten else np.nan,
+            'predict_s': np.mean(predict_zeiten) if predict_zeiten else np.nan,
+        })
+
+    return pd.DataFrame(ergebnisse)
+
+
+if __name__ == "__main__":
+    # Backtest aller Backends auf den Tageswerten aus der Datenbank
+    for sensor in VERLAUF_SENSOREN:
+        df = fetch_daily_sensor_data(sensor["value"])
+        for spalte in PROGNOSE_METRIKEN:
+            print(f"\n📊 Backtest für {sensor['label']} – {spalte}:")
+            print(backtest_forecasters(df, spalte).to_string(index=False))
@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone
+
+# Verzeichnis für die gespeicherten Modelle (unabhängig vom Arbeitsverzeichnis)
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+
+# Anzahl der Versionen, die pro Modell aufbewahrt werden
+MODEL_BEHALTEN = int(os.getenv("MODEL_BEHALTEN", "3"))
+
+# Sekunden, nach denen geprüft wird, ob eine neuere Version vorliegt
+MODEL_PRUEF_INTERVALL = int(os.getenv("MODEL_PRUEF_INTERVALL", "30"))
+
+# Prozessweiter Cache: Name -> {"version", "modell", "meta", "geprueft"}
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+# Funktion zum Speichern einer neuen Modellversion
+def modell_speichern(name, daten, meta):
+    """
+    Speichert ein serialisiertes Modell als JSON unter einer neuen Version.
+    Die Version setzt sich aus Trainingszeitpunkt und Datenbereich zusammen.
+    """
+    verzeichnis = os.path.join(MODEL_DIR, name)
+    os.makedirs(verzeichnis, exist_ok=True)
+
+    trainiert_am = datetime.now(timezone.utc)
+    version = (
+        f"{trainiert_am.strftime('%Y%m%dT%H%M%S%fZ')}"
+        f"_{meta.get('daten_von', 'na')}_{meta.get('daten_bis', 'na')}"
+    )
+
+    inhalt = json.dumps(daten)
+    meta = dict(meta, version=version, name=name,
+                trainiert_am=trainiert_am.isoformat(), dateigroesse=len(inhalt.encode()))
+
+    # Erst Modell, dann Metadaten schreiben – jeweils atomar per os.replace
+    _atomar_schreiben(os.path.join(verzeichnis, f"{version}.json"), inhalt)
+    _atomar_schreiben(os.path.join(verzeichnis, f"{version}.meta.json"), json.dumps(meta))
+
+    _alte_versionen_loeschen(name)
+
+    # Eigener Prozess soll die neue Version sofort verwenden
+    with _cache_lock:
+        _cache.pop(name, None)
+    return version
+
+
+# Funktion zum Laden der neuesten Modellversion (einmal pro Prozess, mit Hot-Swap)
+def modell_laden(name, deserialisieren):
+    """
+    Gibt (modell, meta) der neuesten Version zurück oder (None, None), falls keine existiert.
+    Das Modell wird nur beim ersten Zugriff oder beim Erscheinen einer neueren Version geladen.
+    """
+    jetzt = time.monotonic()
+    with _cache_lock:
+        eintrag = _cache.get(name)
+        if eintrag and jetzt - eintrag["geprueft"] < MODEL_PRUEF_INTERVALL:
+            return eintrag["modell"], eintrag["meta"]
+
+        versionen = _versionen(name)
+        if not versionen:
+            return None, None
+
+        neueste = versionen[-1]
+        if eintrag and eintrag["version"] == neueste:
+            eintrag["geprueft"] = jetzt
+            return eintrag["modell"], eintrag["meta"]
+
+        verzeichnis = os.path.join(MODEL_DIR, name)
+        try:
+            with open(os.path.join(verzeichnis, f"{neueste}.json")) as f:
+                modell = deserialisieren(json.load(f))
+            with open(os.path.join(verzeichnis, f"{neueste}.meta.json")) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            # Version wurde zwischenzeitlich von einem anderen Prozess gelöscht – bisheriges Modell behalten
+            print(f"⚠️ Modellversion {neueste} nicht mehr vorhanden.")
+            if eintrag:
+                return eintrag["modell"], eintrag["meta"]
+            return None, None
+
+        _cache[name] = {"version": neueste, "modell": modell, "meta": meta, "geprueft": jetzt}
+        return modell, meta
+
+
+# Funktion zum Auflisten der Metadaten aller Versionen eines Modells
+def modell_versionen(name):
+    verzeichnis = os.path.join(MODEL_DIR, name)
+    metadaten = []
+    for version in _versionen(name):
+        with open(os.path.join(verzeichnis, f"{version}.meta.json")) as f:
+            metadaten.append(json.load(f))
+    return metadaten
+
+
+# Gibt die vollständig geschriebenen Versionen (mit Metadaten) aufsteigend sortiert zurück
+def _versionen(name):
+    verzeichnis = os.path.join(MODEL_DIR, name)
+    if not os.path.isdir(verzeichnis):
+        return []
+    return sorted(
+        eintrag.name[:-len(".meta.json")]
+        for eintrag in os.scandir(verzeichnis)
+        if eintrag.name.endswith(".meta.json")
+    )
+
+
+# Löscht alle bis auf die neuesten MODEL_BEHALTEN Versionen
+def _alte_versionen_loeschen(name):
+    verzeichnis = os.path.join(MODEL_DIR, name)
+    for version in _versionen(name)[:-MODEL_BEHALTEN]:
+        # Metadaten zuerst löschen, damit die Version sofort nicht mehr gelistet wird
+        for endung in (".meta.json", ".json"):
+            try:
+                os.remove(os.path.join(verzeichnis, f"{version}{endung}"))
+            except FileNotFoundError:
+                pass
+
+
+# Schreibt eine Datei atomar (andere Prozesse sehen nie eine halb geschriebene Datei)
+def _atomar_schreiben(pfad, inhalt):
+    tmp_pfad = f"{pfad}.{os.getpid()}.tmp"
+    with open(tmp_pfad, "w") as f:
+        f.write(inhalt)
+    os.replace(tmp_pfad, pfad)
@@ -0,0 +1,178 @@
+import os
+import sys
+import time
+import heapq
+import marshal
+import cProfile
+import functools
+import itertools
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from flask import Response, abort, jsonify, request
+
+# Profiling-Modus: leer = aus, "cprofile" = deterministisch (pstats), "sample" = Stack-Sampler (Flamegraph)
+PROFILING = os.getenv("PROFILING", "").lower()
+
+# Anzahl der langsamsten Aufrufe, deren Profile aufbewahrt werden
+PROFILING_TOP_N = int(os.getenv("PROFILING_TOP_N", "20"))
+
+# Abtastintervall des Stack-Samplers in Sekunden
+PROFILING_SAMPLE_INTERVALL = float(os.getenv("PROFILING_SAMPLE_INTERVALL", "0.005"))
+
+# Optionales Token für die Admin-Routen (?token=... oder Header X-Profiling-Token)
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+
+# Min-Heap der langsamsten Aufrufe: (dauer, id, eintrag)
+_profile = []
+_profile_lock = threading.Lock()
+_ids = itertools.count(1)
+
+
+# Funktion zum Aufnehmen eines Profils in den begrenzten Speicher der langsamsten Aufrufe
+def _profil_merken(dauer, name, format, daten):
+    with _profile_lock:
+        # Schneller als der langsamste bisher verdrängte Aufruf: gar nicht erst aufnehmen
+        if len(_profile) >= PROFILING_TOP_N and dauer <= _profile[0][0]:
+            return
+        profil_id = next(_ids)
+        eintrag = {
+            "id": profil_id,
+            "callback": name,
+            "dauer_ms": round(dauer * 1000, 1),
+            "zeitpunkt": datetime.now(timezone.utc).isoformat(),
+            "format": format,
+            "daten": daten,
+        }
+        heapq.heappush(_profile, (dauer, profil_id, eintrag))
+        if len(_profile) > PROFILING_TOP_N:
+            heapq.heappop(_profile)
+
+
+# Führt eine Funktion unter cProfile aus und liefert (ergebnis, dauer, pstats-Bytes)
+def _mit_cprofile(funktion, args, kwargs):
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Ein anderer Profiler ist in diesem Thread bereits aktiv
+        ergebnis = funktion(*args, **kwargs)
+        return ergebnis, time.perf_counter() - start, None
+    try:
+        ergebnis = funktion(*args, **kwargs)
+    finally:
+        profiler.disable()
+    dauer = time.perf_counter() - start
+    profiler.create_stats()
+    # Gleiches Format wie pstats.Stats.dump_stats
+    return ergebnis, dauer, marshal.dumps(profiler.stats)
+
+
+# Führt eine Funktion aus, während ein Hintergrund-Thread ihren Stack abtastet
+def _mit_sampler(funktion, args, kwargs):
+    ziel_thread = threading.get_ident()
+    stacks = Counter()
+    fertig = threading.Event()
+
+    def abtasten():
+        while not fertig.wait(PROFILING_SAMPLE_INTERVALL):
+            frame = sys._current_frames().get(ziel_thread)
+            aufrufe = []
+            while frame is not None:
+                code = frame.f_code
+                aufrufe.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if aufrufe:
+                stacks[";".join(reversed(aufrufe))] += 1
+
+    sampler = threading.Thread(target=abtasten, daemon=True)
+    start = time.perf_counter()
+    sampler.start()
+    try:
+        ergebnis = funktion(*args, **kwargs)
+    finally:
+        fertig.set()
+        sampler.join()
+    dauer = time.perf_counter() - start
+
+    # "Collapsed stack"-Format (flamegraph.pl, speedscope)
+    gefaltet = "\n".join(f"{stack} {anzahl}" for stack, anzahl in stacks.items())
+    return ergebnis, dauer, gefaltet.encode()
+
+
+# Decorator: profiliert einen Callback im gewählten Modus
+def _profiliert(funktion):
+    messen = _mit_cprofile if PROFILING == "cprofile" else _mit_sampler
+    format = "pstats" if PROFILING == "cprofile" else "folded"
+
+    @functools.wraps(funktion)
+    def wrapper(*args, **kwargs):
+        ergebnis, dauer, daten = messen(funktion, args, kwargs)
+        if daten is not None:
+            _profil_merken(dauer, funktion.__name__, format, daten)
+        return ergebnis
+    return wrapper
+
+
+# Stellvertreter für die Dash-App, der jeden registrierten Callback profiliert
+class _ProfilierteApp:
+    def __init__(self, app):
+        self._app = app
+
+    def callback(self, *args, **kwargs):
+        registrieren = self._app.callback(*args, **kwargs)
+
+        def decorator(funktion):
+            return registrieren(_profiliert(funktion))
+        return decorator
+
+    def __getattr__(self, name):
+        return getattr(self._app, name)
+
+
+# Prüft das optionale Admin-Token
+def _token_pruefen():
+    if PROFILING_TOKEN and PROFILING_TOKEN not in (
+        request.args.get("token"), request.headers.get("X-Profiling-Token")
+    ):
+        abort(403)
+
+
+def mit_profiling(app):
+    """
+    Gibt bei gesetztem PROFILING eine App zurück, deren Callbacks profiliert werden, und
+    registriert die Admin-Routen /admin/profile. Ohne PROFILING wird die App unverändert
+    zurückgegeben (kein Overhead).
+    """
+    if PROFILING not in ("cprofile", "sample"):
+        return app
+
+    @app.server.route("/admin/profile")
+    def profile_liste():
+        _token_pruefen()
+        with _profile_lock:
+            eintraege = sorted((e for _, _, e in _profile), key=lambda e: e["dauer_ms"], reverse=True)
+        return jsonify([
+            {schluessel: wert for schluessel, wert in e.items() if schluessel != "daten"}
+            | {"download": f"/admin/profile/{e['id']}"}
+            for e in eintraege
+        ])
+
+    @app.server.route("/admin/profile/<int:profil_id>")
+    def profil_herunterladen(profil_id):
+        _token_pruefen()
+        with _profile_lock:
+            eintrag = next((e for _, _, e in _profile if e["id"] == profil_id), None)
+        if eintrag is None:
+            abort(404)
+
+        dateiname = f"{eintrag['callback']}_{profil_id}.{eintrag['format']}"
+        return Response(
+            eintrag["daten"],
+            mimetype="application/octet-stream" if eintrag["format"] == "pstats" else "text/plain",
+            headers={"Content-Disposition": f"attachment; filename={dateiname}"}
+        )
+
+    print(f"⚠️ Profiling aktiv ({PROFILING}), Profile unter /admin/profile")
+    return _ProfilierteApp(app)
@@ -1,8 +1,14 @@
 import os
+import time
+import inspect
+import functools
+import threading
 import requests
 import pandas as pd
+from collections import OrderedDict
 from sqlalchemy import create_engine, text
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
+from cache_utils import gecacht
 
 # Umgebungsvariablen für die Datenbankverbindung
 DB_USER = os.getenv("DB_USER", "gruppeeins")
@@ -14,17 +20,162 @@ DB_NAME = os.getenv("DB_NAME", "umwelt_db")
 # SenseBox-ID (von OpenSenseMap)
 SENSEBOX_ID = os.getenv("SENSEBOX_ID", "67a661af4ef45d0008682744")
 
+# Sensoren des Verlaufsgraphen (Dropdown); für diese werden auch Prognosen berechnet
+VERLAUF_SENSOREN = [
+    {"label": "Temperature (°C)", "value": "67a661af4ef45d0008682745"},
+    {"label": "Pressure (Pa)", "value": "67a661af4ef45d0008682746"},
+    {"label": "Rain (mm)", "value": "67a7ab164ef45d00089ef795"},
+    {"label": "Humidity (%)", "value": "67a661af4ef45d0008682748"},
+    {"label": "Wind speed (km/h)", "value": "67a661af4ef45d0008682749"},
+    {"label": "PM 2.5 (µg/m³)", "value": "67a661af4ef45d000868274b"},
+    {"label": "PM 10 (µg/m³)", "value": "67a661af4ef45d000868274c"}
+]
+
+# Gültigkeitsdauer der zwischengespeicherten API-Antworten in Sekunden (gemeinsam für alle Worker)
+API_CACHE_SEKUNDEN = int(os.getenv("API_CACHE_SEKUNDEN", "20"))
+VERLAUF_CACHE_SEKUNDEN = int(os.getenv("VERLAUF_CACHE_SEKUNDEN", "600"))
+BOX_INFO_CACHE_SEKUNDEN = int(os.getenv("BOX_INFO_CACHE_SEKUNDEN", "3600"))
+
+# Zeitlimit in Sekunden für Anfragen an die OpenSenseMap API (ein hängender Abruf blockiert sonst den Cache)
+API_TIMEOUT_SEKUNDEN = int(os.getenv("API_TIMEOUT_SEKUNDEN", "15"))
+
+# Zeitlimit in Sekunden beim Streamen langer Historien (je Verbindungsaufbau bzw. zwischen zwei Datenblöcken)
+STREAM_TIMEOUT_SEKUNDEN = int(os.getenv("STREAM_TIMEOUT_SEKUNDEN", "60"))
+
+# Zeitraum je API-Anfrage und Zeilen je Batch beim Streamen langer Historien
+STREAM_CHUNK_STUNDEN = int(os.getenv("STREAM_CHUNK_STUNDEN", "24"))
+STREAM_BATCH_ZEILEN = int(os.getenv("STREAM_BATCH_ZEILEN", "5000"))
+
+# Obergrenze für den Speicher des Abfrage-Caches (je Prozess)
+ABFRAGE_CACHE_MAX_BYTES = int(os.getenv("ABFRAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
 # Verbindung zur TimescaleDB aufbauen
 db_url = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 engine = create_engine(db_url)
 
+# Abfrage-Cache: Schlüssel -> (Wasserstand, DataFrame, Bytes), in LRU-Reihenfolge
+_abfrage_cache = OrderedDict()
+_abfrage_cache_lock = threading.Lock()
+_abfrage_statistik = {"treffer": 0, "fehlschlaege": 0, "bytes": 0}
+
+
+# Funktion zum Abrufen des Wasserstands (Datenstand-Zähler) je Sensor
+def wasserstand_holen(tabelle, box_id, sensor_ids=None):
+    """
+    Liefert den Datenstand je (box_id, sensor_id) bzw. für die ganze Box aus 'datenstand'.
+    Die Zähler werden von den Schreibfunktionen erhöht, sobald tatsächlich Zeilen eingefügt
+    wurden – auch beim Nachladen älterer Messwerte (Backfill, Archiv-Import).
+    """
+    with engine.connect() as conn:
+        if not sensor_ids:
+            return conn.execute(text("""
+                SELECT coalesce(sum(version), 0) FROM datenstand
+                WHERE tabelle = :tabelle AND box_id = :box_id
+            """), {"tabelle": tabelle, "box_id": box_id}).scalar()
+
+        zeilen = conn.execute(text("""
+            SELECT sensor_id, version FROM datenstand
+            WHERE tabelle = :tabelle AND box_id = :box_id AND sensor_id = ANY(:sensor_ids)
+        """), {"tabelle": tabelle, "box_id": box_id, "sensor_ids": list(sensor_ids)}).all()
+        return tuple(sorted(tuple(zeile) for zeile in zeilen))
+
+
+# Funktion zum Erhöhen des Datenstands nach dem Einfügen (in derselben Transaktion)
+def datenstand_erhoehen(conn, tabelle, paare):
+    """
+    Erhöht den Zähler je (box_id, sensor_id) aus 'paare'. Sollte am Ende der Transaktion
+    aufgerufen werden, damit die Zeilensperre nur kurz gehalten wird.
+    """
+    paare = sorted(set(paare))  # Feste Reihenfolge vermeidet Deadlocks zwischen Schreibern
+    if not paare:
+        return
+    conn.execute(text("""
+        INSERT INTO datenstand (tabelle, box_id, sensor_id, version)
+        SELECT :tabelle, box_id, sensor_id, 1
+        FROM unnest(CAST(:box_ids AS TEXT[]), CAST(:sensor_ids AS TEXT[])) AS n(box_id, sensor_id)
+        ON CONFLICT (tabelle, box_id, sensor_id) DO UPDATE SET
+            version = datenstand.version + 1,
+            geaendert_am = now()
+    """), {
+        "tabelle": tabelle,
+        "box_ids": [box_id for box_id, _ in paare],
+        "sensor_ids": [sensor_id for _, sensor_id in paare]
+    })
+
+
+# Decorator: Read-Through-Cache für Datenbankabfragen, invalidiert über den Wasserstand
+def abfrage_gecacht(tabelle, sensor_parameter=(), zeitraster=None):
+    """
+    Das Ergebnis bleibt im Speicher, bis sich der Wasserstand der betroffenen Sensoren
+    (bzw. der ganzen Box, falls keine Sensor-Parameter angegeben sind) ändert.
+    Der Wasserstand wird vor der eigentlichen Abfrage gelesen, daher ist ein Treffer nie veraltet.
+
+    Hängt das Ergebnis von der Uhrzeit ab (z. B. now() oder current_date in der Abfrage), muss
+    'zeitraster' (Sekunden) angegeben oder der Zeitpunkt als Parameter übergeben werden; sonst
+    läuft der Eintrag ohne neue Daten nie ab.
+    """
+    def decorator(funktion):
+        signatur = inspect.signature(funktion)
+
+        @functools.wraps(funktion)
+        def wrapper(*args, **kwargs):
+            argumente = signatur.bind(*args, **kwargs)
+            argumente.apply_defaults()
+            schluessel = (funktion.__name__,) + tuple(sorted(argumente.arguments.items()))
+            sensor_ids = [argumente.arguments[name] for name in sensor_parameter]
+            wasserstand = wasserstand_holen(tabelle, argumente.arguments["box_id"], sensor_ids)
+            if zeitraster:
+                # Zeitabhängige Abfragen laufen spätestens nach einem Zeitraster ab
+                wasserstand = (wasserstand, int(time.time() // zeitraster))
+
+            with _abfrage_cache_lock:
+                eintrag = _abfrage_cache.get(schluessel)
+                if eintrag and eintrag[0] == wasserstand:
+                    _abfrage_cache.move_to_end(schluessel)
+                    _abfrage_statistik["treffer"] += 1
+                    return eintrag[1].copy(deep=False)
+                _abfrage_statistik["fehlschlaege"] += 1
+
+            df = funktion(*args, **kwargs)
+            groesse = int(df.memory_usage(deep=True).sum())
+
+            with _abfrage_cache_lock:
+                alt = _abfrage_cache.pop(schluessel, None)
+                if alt:
+                    _abfrage_statistik["bytes"] -= alt[2]
+                _abfrage_cache[schluessel] = (wasserstand, df, groesse)
+                _abfrage_statistik["bytes"] += groesse
+
+                # Älteste Einträge verdrängen, bis die Obergrenze eingehalten wird
+                while _abfrage_statistik["bytes"] > ABFRAGE_CACHE_MAX_BYTES and len(_abfrage_cache) > 1:
+                    _, (_, _, verdraengt) = _abfrage_cache.popitem(last=False)
+                    _abfrage_statistik["bytes"] -= verdraengt
+
+            return df.copy(deep=False)
+        return wrapper
+    return decorator
+
+
+# Funktion zum Abrufen der Kennzahlen des Abfrage-Caches
+def abfrage_cache_statistik():
+    with _abfrage_cache_lock:
+        anfragen = _abfrage_statistik["treffer"] + _abfrage_statistik["fehlschlaege"]
+        return {
+            "treffer": _abfrage_statistik["treffer"],
+            "fehlschlaege": _abfrage_statistik["fehlschlaege"],
+            "trefferquote": round(_abfrage_statistik["treffer"] / anfragen, 3) if anfragen else None,
+            "eintraege": len(_abfrage_cache),
+            "bytes": _abfrage_statistik["bytes"],
+        }
+
 # Funktion zum Abrufen der aktuellen Sensordaten von der OpenSenseMap API
+@gecacht(API_CACHE_SEKUNDEN)
 def daten_von_api_holen(box_id=SENSEBOX_ID):
     """
     Holt aktuelle Sensordaten von der OpenSenseMap API.
     """
     url = f"https://api.opensensemap.org/boxes/{box_id}?format=json"
-    response = requests.get(url)
+    response = requests.get(url, timeout=API_TIMEOUT_SEKUNDEN)
     response.raise_for_status()
     inhalt = response.json()
 
@@ -66,8 +217,9 @@ def daten_in_datenbank_schreiben(df, box_id=SENSEBOX_ID):
         return
 
     with engine.begin() as conn:
+        neu = []
         for _, zeile in df.iterrows():
-            conn.execute(text("""
+            eingefuegt = conn.execute(text("""
                 INSERT INTO sensor_daten (
                     zeitstempel, box_id, sensor_id, messwert,
                     einheit, sensor_typ, icon
@@ -75,7 +227,8 @@ def daten_in_datenbank_schreiben(df, box_id=SENSEBOX_ID):
                     :zeitstempel, :box_id, :sensor_id, :messwert,
                     :einheit, :sensor_typ, :icon
                 )
-                ON CONFLICT (zeitstempel, box_id, sensor_id) DO NOTHING;
+                ON CONFLICT (zeitstempel, box_id, sensor_id) DO NOTHING
+                RETURNING sensor_id;
             """), {
                 "zeitstempel": zeile["zeitstempel"],
                 "box_id": box_id,
@@ -84,9 +237,13 @@ def daten_in_datenbank_schreiben(df, box_id=SENSEBOX_ID):
                 "einheit": zeile["einheit"],
                 "sensor_typ": zeile["sensor_typ"],
                 "icon": zeile["icon"]
-            })
+            }).scalar()
+            if eingefuegt:
+                neu.append((box_id, eingefuegt))
+        datenstand_erhoehen(conn, "sensor_daten", neu)
 
 # Funktion zum Abrufen historischer Verlaufsdaten eines Sensors
+@gecacht(VERLAUF_CACHE_SEKUNDEN)
 def verlauf_daten_von_api_holen(sensor_id, box_id=SENSEBOX_ID, tage=7):
     """
     Holt historische Messwerte eines Sensors basierend auf dem letzten Messzeitpunkt,
@@ -94,7 +251,7 @@ def verlauf_daten_von_api_holen(sensor_id, box_id=SENSEBOX_ID, tage=7):
     """
     # 1. Box-Daten holen
     url_box = f"https://api.opensensemap.org/boxes/{box_id}?format=json"
-    response = requests.get(url_box)
+    response = requests.get(url_box, timeout=API_TIMEOUT_SEKUNDEN)
     response.raise_for_status()
     box_daten = response.json()
 
@@ -117,7 +274,7 @@ def verlauf_daten_von_api_holen(sensor_id, box_id=SENSEBOX_ID, tage=7):
         f"?from-date={von_datum.strftime('%Y-%m-%dT%H:%M:%SZ')}&to-date={bis_datum.strftime('%Y-%m-%dT%H:%M:%SZ')}&download=false"
     )
 
-    response = requests.get(url_data)
+    response = requests.get(url_data, timeout=API_TIMEOUT_SEKUNDEN)
     response.raise_for_status()
     daten_roh = response.json()
 
@@ -143,56 +300,186 @@ def verlauf_in_datenbank_schreiben(df):
         print("⚠️ Keine Verlaufsdaten zum Einfügen.")
         return
 
+    # Alle Zeilen in einer Anfrage (als Arrays) statt einer Anfrage pro Zeile
     with engine.begin() as conn:
-        for _, zeile in df.iterrows():
-            conn.execute(text("""
-                INSERT INTO sensor_verlauf (
-                    zeitstempel, box_id, sensor_id, messwert
-                ) VALUES (
-                    :zeitstempel, :box_id, :sensor_id, :messwert
+        neu = conn.execute(text("""
+            WITH neu AS (
+                INSERT INTO sensor_verlauf (zeitstempel, box_id, sensor_id, messwert)
+                SELECT * FROM unnest(
+                    CAST(:zeitstempel AS TIMESTAMPTZ[]), CAST(:box_id AS TEXT[]),
+                    CAST(:sensor_id AS TEXT[]), CAST(:messwert AS DOUBLE PRECISION[])
                 )
-                ON CONFLICT (zeitstempel, box_id, sensor_id) DO NOTHING;
-            """), {
-                "zeitstempel": zeile["zeitstempel"],
-                "box_id": zeile["box_id"],
-                "sensor_id": zeile["sensor_id"],
-                "messwert": zeile["messwert"]
-            })
+                ON CONFLICT (zeitstempel, box_id, sensor_id) DO NOTHING
+                RETURNING box_id, sensor_id
+            )
+            SELECT DISTINCT box_id, sensor_id FROM neu
+        """), {
+            "zeitstempel": df["zeitstempel"].tolist(),
+            "box_id": df["box_id"].tolist(),
+            "sensor_id": df["sensor_id"].tolist(),
+            "messwert": df["messwert"].tolist()
+        }).all()
+        datenstand_erhoehen(conn, "sensor_verlauf", [tuple(zeile) for zeile in neu])
 
-# Funktion zum Abrufen täglicher Wetterdaten (Temperatur und Regen)
-def fetch_daily_weather_data(temp_sensor_id, rain_sensor_id, box_id=SENSEBOX_ID):
-    query_temp = text("""
-        SELECT zeitstempel::date AS datum, 
-               MIN(messwert) as min_val, 
-               MAX(messwert) as max_val
-        FROM sensor_verlauf
-        WHERE sensor_id = :sensor_id AND box_id = :box_id 
-        GROUP BY datum
-    """)
+# Funktion zum speicherschonenden Abrufen langer Sensorhistorien
+def verlauf_daten_streamen(sensor_id, von_datum, bis_datum, box_id=SENSEBOX_ID,
+                           chunk=timedelta(hours=STREAM_CHUNK_STUNDEN)):
+    """
+    Holt Messwerte eines Sensors als CSV in zeitlich begrenzten Abschnitten und liefert sie
+    als DataFrame-Batches (höchstens STREAM_BATCH_ZEILEN Zeilen). Die Antwort wird gestreamt
+    und nie vollständig in den Speicher geladen.
+    """
+    url = f"https://api.opensensemap.org/boxes/{box_id}/data/{sensor_id}"
+    start = von_datum
+    while start < bis_datum:
+        ende = min(start + chunk, bis_datum)
+        params = {
+            "from-date": start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "to-date": ende.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "format": "csv",
+            "download": "false"
+        }
+
+        with requests.get(url, params=params, stream=True, timeout=STREAM_TIMEOUT_SEKUNDEN) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            try:
+                batches = pd.read_csv(
+                    response.raw,
+                    usecols=["createdAt", "value"],
+                    dtype={"createdAt": "string"},
+                    chunksize=STREAM_BATCH_ZEILEN
+                )
+                for batch in batches:
+                    # Ungültige Zeitstempel oder Messwerte verwerfen statt den ganzen Abschnitt abzubrechen
+                    df = pd.DataFrame({
+                        "zeitstempel": pd.to_datetime(batch["createdAt"], format="ISO8601", utc=True, errors="coerce"),
+                        "messwert": pd.to_numeric(batch["value"], errors="coerce")
+                    }).dropna()
+                    if df.empty:
+                        continue
+                    df["sensor_id"] = sensor_id
+                    df["box_id"] = box_id
+                    yield df
+            except pd.errors.EmptyDataError:
+                # Leere Antwort: keine Messwerte in diesem Abschnitt
+                pass
+
+        start = ende
 
-    query_rain = text("""
-        SELECT zeitstempel::date AS datum, 
-               AVG(messwert) as rain_avg
+# Funktion zum Nachladen einer langen Historie direkt in die Datenbank
+def verlauf_streamen_und_schreiben(sensor_id, von_datum, bis_datum, box_id=SENSEBOX_ID):
+    """
+    Streamt die Historie eines Sensors und schreibt jeden Batch sofort in 'sensor_verlauf'.
+    Der Speicherbedarf bleibt unabhängig von der Länge des Zeitraums konstant.
+    """
+    anzahl = 0
+    for df in verlauf_daten_streamen(sensor_id, von_datum, bis_datum, box_id):
+        verlauf_in_datenbank_schreiben(df)
+        anzahl += len(df)
+    return anzahl
+
+# Funktion zum Abrufen täglicher Kennzahlen (Minimum, Maximum, Mittel) eines Sensors
+@abfrage_gecacht("sensor_verlauf", sensor_parameter=("sensor_id",))
+def fetch_daily_sensor_data(sensor_id, box_id=SENSEBOX_ID):
+    query = text("""
+        SELECT zeitstempel::date AS datum,
+               MIN(messwert) AS min_val,
+               MAX(messwert) AS max_val,
+               AVG(messwert) AS avg_val
         FROM sensor_verlauf
-        WHERE sensor_id = :sensor_id AND box_id = :box_id 
+        WHERE sensor_id = :sensor_id AND box_id = :box_id
         GROUP BY datum
+        ORDER BY datum
     """)
 
     with engine.connect() as conn:
-        df_temp = pd.read_sql(query_temp, conn, params={"sensor_id": temp_sensor_id, "box_id": box_id})
-        df_rain = pd.read_sql(query_rain, conn, params={"sensor_id": rain_sensor_id, "box_id": box_id})
+        return pd.read_sql(query, conn, params={"sensor_id": sensor_id, "box_id": box_id})
 
-    df = pd.merge(df_temp, df_rain, on='datum', how='inner')
-    return df
+# Funktion zum Schreiben der Prognosen in die Datenbank
+def prognose_in_datenbank_schreiben(df):
+    """
+    Schreibt Prognosen in die Tabelle 'sensor_prognose'. Bestehende Prognosen ab dem
+    ersten neuen Tag werden je Sensor und Kennzahl ersetzt, vergangene Prognosetage gelöscht.
+    """
+    if df is None or df.empty:
+        print("⚠️ Keine Prognosen zum Einfügen.")
+        return
+
+    with engine.begin() as conn:
+        for (box_id, sensor_id, metric), gruppe in df.groupby(["box_id", "sensor_id", "metric"]):
+            conn.execute(text("""
+                DELETE FROM sensor_prognose
+                WHERE box_id = :box_id AND sensor_id = :sensor_id
+                  AND metric = :metric AND ds >= :erstes_ds
+            """), {
+                "box_id": box_id,
+                "sensor_id": sensor_id,
+                "metric": metric,
+                "erstes_ds": gruppe["ds"].min()
+            })
+
+        conn.execute(text("""
+            INSERT INTO sensor_prognose (
+                box_id, sensor_id, metric, ds, yhat, yhat_lower, yhat_upper, model_version
+            ) VALUES (
+                :box_id, :sensor_id, :metric, :ds, :yhat, :yhat_lower, :yhat_upper, :model_version
+            )
+            ON CONFLICT (ds, box_id, sensor_id, metric) DO UPDATE SET
+                yhat = EXCLUDED.yhat,
+                yhat_lower = EXCLUDED.yhat_lower,
+                yhat_upper = EXCLUDED.yhat_upper,
+                model_version = EXCLUDED.model_version,
+                erstellt_am = now();
+        """), df[[
+            "box_id", "sensor_id", "metric", "ds", "yhat", "yhat_lower", "yhat_upper", "model_version"
+        ]].to_dict("records"))
+
+        # Vergangene Prognosetage werden nicht mehr angezeigt; die Tabelle bleibt so klein
+        conn.execute(text("""
+            DELETE FROM sensor_prognose
+            WHERE box_id = ANY(:box_ids) AND ds < current_date
+        """), {"box_ids": df["box_id"].unique().tolist()})
+
+        datenstand_erhoehen(conn, "sensor_prognose", zip(df["box_id"], df["sensor_id"]))
+
+# Funktion zum Abrufen der aktuellen Prognosen aller Sensoren
+def prognose_aus_datenbank_holen(box_id=SENSEBOX_ID, tage=7):
+    """
+    Holt je Sensor und Kennzahl die nächsten 'tage' Prognosetage ab heute aus 'sensor_prognose'.
+    Vergangene Tage werden nie angezeigt, auch wenn ein Prognose-Lauf ausgefallen ist.
+    """
+    # Das Datum ist Teil des Cache-Schlüssels, nach Mitternacht wird also neu gelesen
+    return _prognose_ab_datum_holen(box_id, tage, date.today())
+
+
+@abfrage_gecacht("sensor_prognose")
+def _prognose_ab_datum_holen(box_id, tage, heute):
+    query = text("""
+        SELECT sensor_id, metric, ds, yhat, yhat_lower, yhat_upper, model_version
+        FROM (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY sensor_id, metric ORDER BY ds
+            ) AS rang
+            FROM sensor_prognose
+            WHERE box_id = :box_id AND ds >= :heute
+        ) p
+        WHERE rang <= :tage
+        ORDER BY sensor_id, metric, ds
+    """)
+
+    with engine.connect() as conn:
+        return pd.read_sql(query, conn, params={"box_id": box_id, "tage": tage, "heute": heute})
 
 
 # Funktion zum Abrufen allgemeiner Box-Informationen
+@gecacht(BOX_INFO_CACHE_SEKUNDEN)
 def box_info_holen(box_id = SENSEBOX_ID):
     """
     Holt allgemeine Informationen zur SenseBox (Name, createdAt, exposure).
     """
     url = f"https://api.opensensemap.org/boxes/{box_id}?format=json"
-    response = requests.get(url)
+    response = requests.get(url, timeout=API_TIMEOUT_SEKUNDEN)
     response.raise_for_status()
     box = response.json()
 
@@ -205,3 +492,19 @@ def box_info_holen(box_id = SENSEBOX_ID):
         "created_at": created_at,
         "exposure": exposure
     }
+
+
+if __name__ == "__main__":
+    # Historie nachladen, z. B.: python sensor_utils.py --tage 365
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Lädt die Historie der senseBox-Sensoren in die Datenbank.")
+    parser.add_argument("--tage", type=int, default=30, help="Anzahl der Tage rückwirkend ab jetzt")
+    parser.add_argument("--sensor", action="append", help="Sensor-ID (mehrfach möglich, Standard: alle)")
+    args = parser.parse_args()
+
+    bis = datetime.now(timezone.utc)
+    von = bis - timedelta(days=args.tage)
+    for sensor_id in args.sensor or [sensor["value"] for sensor in VERLAUF_SENSOREN]:
+        anzahl = verlauf_streamen_und_schreiben(sensor_id, von, bis)
+        print(f"✅ {sensor_id}: {anzahl} Messwerte geschrieben")
@@ -0,0 +1,183 @@
+import os
+import time
+import hashlib
+import threading
+from flask import jsonify, request
+from flask_compress import Compress
+from sqlalchemy import text
+from sensor_utils import engine, abfrage_cache_statistik
+from cache_utils import CACHE_DIR
+from buffer_utils import puffer_statistik
+
+# Verzeichnis der Dash-Assets (im Container als /app/assets eingebunden)
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+# Cache-Dauer für Assets mit Fingerprint in der URL (Standard: ein Jahr)
+ASSET_CACHE_SEKUNDEN = int(os.getenv("ASSET_CACHE_SEKUNDEN", str(365 * 24 * 3600)))
+
+# Kategorien, die zusammen den ersten Seitenaufruf ausmachen
+ERSTAUFRUF_KATEGORIEN = ("seite", "layout", "abhaengigkeiten", "komponenten", "assets")
+
+_startzeit = time.time()
+
+# Übertragene Bytes je Kategorie: {"anfragen", "bytes", "roh_bytes"}
+_nutzlast = {}
+_nutzlast_lock = threading.Lock()
+
+
+# Funktion zum Bilden einer Asset-URL mit Inhalts-Fingerprint
+def asset_url(pfad):
+    """
+    Gibt '/assets/<pfad>?v=<hash>' zurück. Ändert sich die Datei, ändert sich die URL,
+    sodass die Datei im Browser dauerhaft zwischengespeichert werden kann.
+    """
+    try:
+        with open(os.path.join(ASSETS_DIR, pfad), "rb") as f:
+            fingerprint = hashlib.sha1(f.read()).hexdigest()[:12]
+    except FileNotFoundError:
+        print(f"⚠️ Asset {pfad} nicht gefunden.")
+        return f"/assets/{pfad}"
+    return f"/assets/{pfad}?v={fingerprint}"
+
+
+# Ordnet einen Anfragepfad einer Messkategorie zu (None = nicht gezählt)
+def _kategorie(pfad):
+    if pfad == "/":
+        return "seite"
+    if pfad == "/_dash-layout":
+        return "layout"
+    if pfad == "/_dash-dependencies":
+        return "abhaengigkeiten"
+    if pfad == "/_dash-update-component":
+        return "callback"
+    if pfad.startswith("/_dash-component-suites/"):
+        return "komponenten"
+    if pfad.startswith("/assets/"):
+        return "assets"
+    return None
+
+
+# WSGI-Middleware: zählt die tatsächlich gesendeten (ggf. komprimierten) Bytes je Kategorie
+class _NutzlastZaehler:
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        kategorie = _kategorie(environ.get("PATH_INFO", ""))
+        antwort = self.wsgi_app(environ, start_response)
+        if kategorie is None:
+            return antwort
+        return self._zaehlen(antwort, environ, kategorie)
+
+    def _zaehlen(self, antwort, environ, kategorie):
+        gesendet = 0
+        try:
+            for teil in antwort:
+                gesendet += len(teil)
+                yield teil
+        finally:
+            if hasattr(antwort, "close"):
+                antwort.close()
+            kategorie = environ.get("umwelt.kategorie", kategorie)
+            with _nutzlast_lock:
+                eintrag = _nutzlast.setdefault(kategorie, {"anfragen": 0, "bytes": 0, "roh_bytes": 0})
+                eintrag["anfragen"] += 1
+                eintrag["bytes"] += gesendet
+                eintrag["roh_bytes"] += environ.get("umwelt.roh_bytes", gesendet)
+
+
+# Funktion zum Abrufen der Nutzlast-Kennzahlen (je Kategorie, je Erstaufruf und je Tick)
+def nutzlast_statistik(callbacks_je_tick):
+    with _nutzlast_lock:
+        kategorien = {name: dict(eintrag) for name, eintrag in _nutzlast.items()}
+
+    seitenaufrufe = kategorien.get("seite", {}).get("anfragen", 0)
+    erstaufruf = sum(kategorien.get(name, {}).get("bytes", 0) for name in ERSTAUFRUF_KATEGORIEN)
+    tick = kategorien.get("tick", {})
+    return {
+        "kategorien": kategorien,
+        "bytes_je_erstaufruf": round(erstaufruf / seitenaufrufe) if seitenaufrufe else None,
+        # Obergrenze: ein Tick löst nur die Callbacks der Sensoren mit neuen Messwerten aus
+        "bytes_je_tick": round(tick["bytes"] / tick["anfragen"] * callbacks_je_tick) if tick else None,
+        "callbacks_je_tick": callbacks_je_tick,
+    }
+
+
+def init_auslieferung(app):
+    """
+    Komprimiert Antworten per Brotli bzw. gzip, versieht Assets mit Fingerprint mit
+    langlebigen Cache-Headern und misst die übertragenen Bytes (abrufbar unter /healthz).
+    """
+    server = app.server
+    server.config.update(
+        COMPRESS_ALGORITHM=["br", "gzip"],
+        # Statische Dateien werden gestreamt ausgeliefert; Server-Sent-Events sind kein komprimierter Mimetype
+        COMPRESS_ALGORITHM_STREAMING=["br", "deflate"],
+    )
+    Compress(server)
+
+    # Nach Compress registriert, läuft also vor der Komprimierung (Flask ruft in umgekehrter Reihenfolge auf)
+    @server.after_request
+    def auslieferung_nachbearbeiten(response):
+        if response.content_length is not None:
+            request.environ["umwelt.roh_bytes"] = response.content_length
+
+        # Callbacks, die durch ein Live-Signal eines Sensors ausgelöst wurden, gehören zu einem Tick
+        if request.path == "/_dash-update-component":
+            ausloeser = (request.get_json(silent=True) or {}).get("changedPropIds") or []
+            if any('"sensor-signal"' in prop for prop in ausloeser):
+                request.environ["umwelt.kategorie"] = "tick"
+
+        # Fingerprint in der URL (?v= über asset_url, ?m= von Dash, Hash-Parameter der Icon-Fonts)
+        if request.path.startswith("/assets/") and request.query_string and response.status_code == 200:
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = ASSET_CACHE_SEKUNDEN
+            response.cache_control.immutable = True
+        return response
+
+    server.wsgi_app = _NutzlastZaehler(server.wsgi_app)
+
+
+def init_health(app):
+    """
+    Registriert /healthz (Prozess lebt) und /readyz (Datenbank und Cache erreichbar).
+    Beide Endpunkte fragen bewusst nicht die OpenSenseMap API ab.
+    """
+    # Anzahl der Server-Callbacks, die ein Live-Signal auslösen kann (Bytes je Tick, wenn alle Sensoren neue Werte haben)
+    callbacks_je_tick = sum(
+        any('"sensor-signal"' in eingabe["id"] for eingabe in callback["inputs"])
+        for callback in app.callback_map.values()
+        if "callback" in callback
+    )
+
+    @app.server.route("/healthz")
+    def healthz():
+        return jsonify(
+            status="ok",
+            pid=os.getpid(),
+            laufzeit_s=round(time.time() - _startzeit),
+            abfrage_cache=abfrage_cache_statistik(),
+            ringpuffer=puffer_statistik(),
+            nutzlast=nutzlast_statistik(callbacks_je_tick)
+        )
+
+    @app.server.route("/readyz")
+    def readyz():
+        pruefungen = {}
+
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            pruefungen["datenbank"] = "ok"
+        except Exception as e:
+            pruefungen["datenbank"] = f"fehler: {e.__class__.__name__}"
+
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            pruefungen["cache"] = "ok" if os.access(CACHE_DIR, os.W_OK) else "nicht beschreibbar"
+        except OSError as e:
+            pruefungen["cache"] = f"fehler: {e.__class__.__name__}"
+
+        bereit = all(wert == "ok" for wert in pruefungen.values())
+        return jsonify(status="ok" if bereit else "nicht bereit", **pruefungen), 200 if bereit else 503
@@ -0,0 +1,5 @@
+# WSGI-Einstiegspunkt für den Produktivbetrieb, z. B.:
+#   gunicorn -c gunicorn.conf.py wsgi:server
+from app import app
+
+server = app.server